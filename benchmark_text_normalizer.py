@@ -0,0 +1,80 @@
+###################################################################
+#
+# Benchmark of replace_words and TextNormalizer
+#
+# Usage: python benchmark_text_normalizer.py [n_replacements] [n_occupations]
+#
+###################################################################
+
+import random
+import sys
+import timeit
+
+from mlgrampsconnect import replace_words, TextNormalizer, \
+    get_occupation_word_list, OccupationNormalizer
+
+
+def get_random_word(rnd: random.Random, min_len: int, max_len: int) -> str:
+    return "".join(rnd.choice("abcdefghijklmnopqrstuvwxyz")
+                   for i in range(rnd.randint(min_len, max_len)))
+
+def get_test_data(n_replacements: int, n_occupations: int, randomseed: int = 1) -> (list, list):
+    rnd = random.Random(randomseed)
+    words = [get_random_word(rnd, 3, 10) for i in range(500)]
+    replacement_table = [(get_random_word(rnd, 4, 9), rnd.choice(words))
+                         for i in range(n_replacements)]
+    occupations = []
+    for i in range(n_occupations):
+        occupation_words = rnd.sample(words, rnd.randint(1, 4))
+        if rnd.random() < 0.3:
+            # a text to replace
+            occupation_words.append(rnd.choice(replacement_table)[0])
+        occupation = " ".join(occupation_words)
+        if rnd.random() < 0.3:
+            occupation = occupation + " ({}.{})".format(rnd.randint(1, 99), rnd.choice("-,/&?'"))
+        occupations.append(occupation)
+    return (replacement_table, occupations)
+
+def main():
+    n_replacements = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    n_occupations = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    replacement_table, occupations = get_test_data(n_replacements, n_occupations)
+    stopword_words_list = ["en", "de", "te", "van"]
+    place_words_list = ["ede", "utrecht", "amsterdam"]
+    occupation_exclude_words_list = ["onbekend", "zonder", "beroep"]
+    filter_lists = (stopword_words_list, place_words_list, occupation_exclude_words_list)
+
+    # the results should be identical
+    text_normalizer = TextNormalizer(replacement_table)
+    occupation_normalizer = OccupationNormalizer(replacement_table, *filter_lists)
+    # maxsize 0: every text is normalized again
+    text_normalizer_cold = TextNormalizer(replacement_table, maxsize=0)
+    for occupation in occupations:
+        assert text_normalizer.replace_words(occupation) == replace_words(replacement_table, occupation)
+        assert occupation_normalizer.get_word_list(occupation) == \
+            get_occupation_word_list(occupation, replacement_table, filter_lists)
+
+    print("{:,} replacements, {:,} occupations ({:,} distinct)".format(
+        n_replacements, n_occupations, len(set(occupations))))
+    timings = (
+        ("replace_words", lambda: [replace_words(replacement_table, occupation)
+                                   for occupation in occupations]),
+        ("TextNormalizer (not cached)", lambda: [text_normalizer_cold.replace_words(occupation)
+                                                 for occupation in occupations]),
+        ("TextNormalizer (cached)", lambda: [text_normalizer.replace_words(occupation)
+                                             for occupation in occupations]),
+        ("get_occupation_word_list", lambda: [get_occupation_word_list(occupation, replacement_table, filter_lists)
+                                              for occupation in occupations]),
+        ("OccupationNormalizer (cached)", lambda: [occupation_normalizer.get_word_list(occupation)
+                                                   for occupation in occupations]),
+    )
+    base_seconds = None
+    for name, func in timings:
+        seconds = min(timeit.repeat(func, number=1, repeat=3))
+        if base_seconds is None:
+            base_seconds = seconds
+        print("{:<32} {:8.4f} s  {:6.1f}x".format(name, seconds, base_seconds / seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,17 +7,35 @@
 # ==========================================
 
 import random
+import array
+import operator
+import bisect
+import functools
+import itertools
+import abc
 import lxml.etree
 import re
 import Levenshtein
 import multiprocessing
+import threading
+import zlib
 from multiprocessing import Pool
+from multiprocessing import shared_memory
+# resource_tracker is not documented, it's only used for ensure_running (see WorkerSession)
+from multiprocessing import resource_tracker
 import sys
 import joblib
 import pickle
 import csv
 import os
+import json
+import struct
+import hashlib
+import tempfile
+import shutil
 from datetime import datetime
+from typing import NamedTuple
+import numpy as np
 
 _JLN_SDN_OFFSET = 32083
 _JLN_DAYS_PER_5_MONTHS = 153
@@ -80,6 +98,31 @@ _ARG_PERSONLINK_LINKTYPE = 8
 _ARG_PERSONLINK_AGE_DELTA = 9
 _ARG_PERSONLINK_KWARGS_FEATURES = 10
 
+# Increase the version when the meaning of the tables changes without a
+# change of their fields, the fields are part of the version of a snapshot
+# (see get_snapshot_version)
+_SNAPSHOT_CACHE_VERSION = 1
+_SNAPSHOT_MAGIC = b'MLGCSNAP'
+_SNAPSHOT_HEADER_FORMAT = '<8sII'
+
+# The pool modes of MLGrampsConnect.get_personlink_list
+_PERSONLINK_POOL_MODES = ('SharedState', 'SharedMemory', 'PerTask')
+
+# Increase the version when the shards or the manifest of a
+# PersonlinkCheckpoint change
+_PERSONLINK_CHECKPOINT_VERSION = 1
+
+_COL_PERSONRECORD_HANDLE = 0
+_COL_PERSONRECORD_ID = 1
+_COL_PERSONRECORD_NAME_LIST = 2
+_COL_PERSONRECORD_GENDER = 3
+_COL_PERSONRECORD_RESIDENCE = 4
+_COL_PERSONRECORD_OCCUPATION = 5
+_COL_PERSONRECORD_OCCUPATION_LIST = 6
+_COL_PERSONRECORD_EVENTREF_LIST = 7
+_COL_PERSONRECORD_CHILDOF_LIST = 8
+_COL_PERSONRECORD_PARENTIN_LIST = 9
+
 
 ###################################################################
 #
@@ -155,6 +198,47 @@ def linktype_inttostr_mapping(linktype_mode: str,
         linktype_mode=linktype_mode, include_unknown=include_unknown))
 
 
+###################################################################
+#
+# Record Classes
+#
+###################################################################
+
+# The records are (immutable) tuples, so the fields can still be read
+# with the COL_* constants. The field order MUST follow these constants.
+# The fields holding tuples are collected in lists and converted once.
+
+class BirthEvent(NamedTuple):
+    handle: str
+    dateval_val: str
+    dateval_type: str
+
+class Family(NamedTuple):
+    handle: str
+    father: str
+    mother: str
+    childref_list: tuple
+
+class Relative(NamedTuple):
+    family_handle: str
+    person_handle: str
+    linktype: str
+
+    # Written as a plain tuple (e.g. in the relatives column of
+    # person_list.csv), like before the record classes existed
+    __repr__ = tuple.__repr__
+
+class Person(NamedTuple):
+    handle: str
+    id: str
+    name_list: tuple
+    gender: str
+    birth_date: tuple
+    residence: str
+    occupation: str
+    relatives: tuple
+
+
 ###################################################################
 #
 # List Functions
@@ -181,7 +265,37 @@ def get_handle_list(elem, xmlns, child_tag: str, attrib_tag: str) -> list:
             handle_list.append(handle)
     return handle_list
     
+class HandleIndex:
+    """ Index (handle -> listindex) over a list of listitems with a handle
+        column. Like get_listitem_from_list_by_handle the first listitem
+        with the given handle is found, but in O(1) instead of O(n).
+        The index is not updated when the list changes.
+    """
+    def __init__(self, list, col_handle):
+        self.list = list
+        self.col_handle = col_handle
+        self.index = {}
+        for i in range(len(list)):
+            self.index.setdefault(list[i][col_handle], i)
+
+    def __len__(self):
+        return len(self.list)
+
+    def __contains__(self, handle):
+        return handle in self.index
+
+    def get_index(self, handle) -> int:
+        return self.index.get(handle)
+
+    def get(self, handle) -> (tuple, int):
+        listindex = self.index.get(handle)
+        if listindex is None:
+            return (None, None)
+        return (self.list[listindex], listindex)
+
 def get_listitem_from_list_by_handle(list, handle, col_handle):
+    # Kept for compatibility only. Each call is a linear scan, so for
+    # repeated lookups in the same list build a HandleIndex once.
     listitem = None
     listindex = None
     for i in range(len(list)):
@@ -266,12 +380,26 @@ def julian_sdn(year, month, day):
            + (month * _JLN_DAYS_PER_5_MONTHS + 2) // 5 \
            + day - _JLN_SDN_OFFSET
 
-def get_date_sort_value(textdate: str) -> int:
+def julian_sdn_array(year, month, day):
+    """ Vectorized julian_sdn for NumPy integer arrays
+    """
+    year = np.where(year < 0, year + 4801, year + 4800)
+
+    # Adjust the start of the year
+    month_gt_2 = month > 2
+    year = np.where(month_gt_2, year, year - 1)
+    month = np.where(month_gt_2, month - 3, month + 9)
+
+    return (year * _JLN_DAYS_PER_4_YEARS) // 4 \
+           + (month * _JLN_DAYS_PER_5_MONTHS + 2) // 5 \
+           + day - _JLN_SDN_OFFSET
+
+def get_date_parts(textdate: str) -> tuple:
     """ function to convert a date text string to a
-        year, month, day format and then to a julian_sdn.
+        (year, month, day) tuple, or None if textdate is empty.
         The gramps internal text format for dates is Y-M-D
     """
-    sort_value = 0
+    date_parts = None
     bc = False
     year = 0
     month = 0
@@ -296,30 +424,58 @@ def get_date_sort_value(textdate: str) -> int:
                 month = int(dateparts[1])
                 if number_of_dateparts > 2:
                     day = int(dateparts[2])
-            sort_value = julian_sdn(year, month, day)
+            date_parts = (year, month, day)
+    return date_parts
+
+@functools.lru_cache(maxsize=1 << 16)
+def get_date_sort_value(textdate: str) -> int:
+    """ function to convert a date text string to a
+        year, month, day format and then to a julian_sdn.
+        The gramps internal text format for dates is Y-M-D.
+        The results are cached, because the same birth dates are
+        converted over and over again for every pair of persons.
+    """
+    sort_value = 0
+    date_parts = get_date_parts(textdate)
+    if date_parts:
+        sort_value = julian_sdn(*date_parts)
     return sort_value
 
-def get_age_delta_inyears(firstdate: str, lastdate: str,
-                          accept_none_dates: bool,
-                          max_abs_age_delta: int) -> (float, bool):
-    """ function to calculate the difference between the
-        (in this case birth)dates of two persons
+def get_date_sort_values(textdates) -> np.ndarray:
+    """ Vectorized get_date_sort_value: convert a sequence of date text
+        strings (None is treated as '') to an int64 array of julian_sdn's.
+        Every distinct text string is parsed only once.
+    """
+    value_ids = {}
+    date_parts_list = []
+    ids = np.empty(len(textdates), dtype=np.int64)
+    for i, textdate in enumerate(textdates):
+        id = value_ids.get(textdate)
+        if id is None:
+            id = len(date_parts_list)
+            value_ids[textdate] = id
+            date_parts_list.append(get_date_parts(textdate) if textdate else None)
+        ids[i] = id
+
+    # (year, month, day) per distinct text string, 0 (no date) for None
+    known = np.array([date_parts is not None for date_parts in date_parts_list], dtype=bool)
+    parts = np.array([date_parts if date_parts else (0, 0, 0) for date_parts in date_parts_list],
+                     dtype=np.int64).reshape(-1, 3)
+    sort_values = np.where(known, julian_sdn_array(parts[:, 0], parts[:, 1], parts[:, 2]), 0)
+    return sort_values[ids]
+
+def get_age_delta_inyears_from_sdn(first_sdn: int, last_sdn: int,
+                                   accept_none_dates: bool,
+                                   max_abs_age_delta: int) -> (float, bool):
+    """ get_age_delta_inyears for already converted dates, None means
+        an unknown date
     """
     age_delta_inyears = None
     result = False
 
-    if firstdate and lastdate:
-        if firstdate:
-            firstdays = get_date_sort_value(firstdate)
-        else:
-            firstdays = 0
-        if lastdate:
-            lastdays = get_date_sort_value(lastdate)
-        else:
-            lastdays = 0
-        age_delta_indays = lastdays - firstdays
+    if (first_sdn is not None) and (last_sdn is not None):
         # round at 2 digits, a day is about 0,00274 year
-        age_delta_inyears = round(age_delta_indays / 365.25, 2)
+        age_delta_inyears = round((last_sdn - first_sdn) / 365.25, 2)
         if max_abs_age_delta < 0:
             # Include all age_delta values
             result = True
@@ -331,6 +487,31 @@ def get_age_delta_inyears(firstdate: str, lastdate: str,
 
     return (age_delta_inyears, result)
 
+def get_age_delta_inyears(firstdate: str, lastdate: str,
+                          accept_none_dates: bool,
+                          max_abs_age_delta: int) -> (float, bool):
+    """ function to calculate the difference between the
+        (in this case birth)dates of two persons
+    """
+    first_sdn = None
+    last_sdn = None
+    if firstdate and lastdate:
+        first_sdn = get_date_sort_value(firstdate)
+        last_sdn = get_date_sort_value(lastdate)
+    return get_age_delta_inyears_from_sdn(first_sdn, last_sdn,
+                                          accept_none_dates=accept_none_dates,
+                                          max_abs_age_delta=max_abs_age_delta)
+
+def get_birth_date_sdn_list(person_list: list) -> list:
+    """ The julian_sdn of the birth date per person in the person_list,
+        or None if the birth date is unknown
+    """
+    birth_dates = [person[COL_PERSON_BIRTH_DATE] for person in person_list]
+    sort_values = get_date_sort_values(
+        [birth_date[0] if birth_date else None for birth_date in birth_dates]).tolist()
+    return [sort_value if birth_date and birth_date[0] else None
+            for birth_date, sort_value in zip(birth_dates, sort_values)]
+
 
 ###################################################################
 #
@@ -360,6 +541,79 @@ def replace_words(replacement_list: list, text: str) -> str:
     # return result
     return text
 
+# The characters which replace_words replaces by a space
+_REPLACE_WORDS_DELETE_CHARS = '",().-&\'?/0123456789'
+
+# Replacement lists up to this length are searched without the bigram index
+_TEXT_NORMALIZER_MIN_INDEXED = 256
+
+class TextNormalizer:
+    """ replace_words compiled for one replacement_list, with exactly the same
+        result.
+
+        The replacements are applied in the order of the replacement_list and
+        a replacement also applies to the text produced by the replacements
+        before it. The texts to replace are indexed by their first two
+        characters, so the bigrams of the text give the few replacements which
+        can occur in it, instead of searching every text to replace. Only
+        those are replaced and after every replacement the new text is
+        searched again. The characters to delete are replaced in one
+        str.translate. The results are cached per text.
+    """
+    def __init__(self, replacement_list: list, maxsize: int = 1 << 16):
+        self.replacement_list = [tuple(replacement[:2]) for replacement in replacement_list]
+        # first two characters -> [replacement index, ...], texts to replace
+        # of one character (or empty) are searched always
+        self.bigram_indexes = {}
+        self.short_indexes = []
+        for idx, (old_text, new_text) in enumerate(self.replacement_list):
+            if len(old_text) < 2:
+                self.short_indexes.append(idx)
+            else:
+                self.bigram_indexes.setdefault(old_text[:2], []).append(idx)
+        self.delete_table = str.maketrans(_REPLACE_WORDS_DELETE_CHARS,
+                                          ' ' * len(_REPLACE_WORDS_DELETE_CHARS))
+        self.maxsize = maxsize
+        self._cache = {}
+
+    def get_replacement_indexes(self, text: str, min_idx: int = 0) -> list:
+        """ The sorted indexes (>= min_idx) of the replacements of which the
+            text to replace occurs in text
+        """
+        replacement_list = self.replacement_list
+        if len(replacement_list) <= _TEXT_NORMALIZER_MIN_INDEXED:
+            # searching every text to replace is faster for a short list
+            return [idx for idx in range(min_idx, len(replacement_list))
+                    if replacement_list[idx][0] in text]
+        indexes = [idx for idx in self.short_indexes if idx >= min_idx]
+        text_bigrams = set(map(operator.add, text, text[1:]))
+        for bigram in self.bigram_indexes.keys() & text_bigrams:
+            indexes.extend(idx for idx in self.bigram_indexes[bigram] if idx >= min_idx)
+        indexes = [idx for idx in indexes if replacement_list[idx][0] in text]
+        indexes.sort()
+        return indexes
+
+    def replace_words(self, text: str) -> str:
+        result = self._cache.get(text)
+        if result is None:
+            result = text
+            # replace typos, etc. (this is case-sensitive!)
+            indexes = self.get_replacement_indexes(result)
+            while indexes:
+                idx = indexes.pop(0)
+                old_text, new_text = self.replacement_list[idx]
+                if old_text in result:
+                    result = result.replace(old_text, new_text)
+                    # the replacement can create (or remove) texts to replace
+                    indexes = self.get_replacement_indexes(result, idx + 1)
+            # delete characters and digits
+            result = result.translate(self.delete_table)
+            if len(self._cache) >= self.maxsize:
+                self._cache.clear()
+            if self.maxsize > 0:
+                self._cache[text] = result
+        return result
+
 
 ###################################################################
 #
@@ -458,23 +712,431 @@ class ValueDateItem:
         self.valuestr = valuestr
         self.datestr = datestr
 
-def get_valuedatelist_correspondence(valuedatelist1, valuedatelist2):
+def parse_valueset(valueasstring: str) -> frozenset:
+    """ The (interned) value strings of a value date list. Two value date
+        lists have a value in common (ValueDateList.HasValueIn) if their
+        valuesets are not disjoint.
+    """
+    return frozenset(sys.intern(valdatitem.valuestr)
+                     for valdatitem in ValueDateList(valueasstring).valuedatelist)
+
+def get_valuedatelist_correspondence(valuedatelist1, valuedatelist2, valuesets: dict = None):
+    """ valuesets: dict (optional)
+            The valuesets per value date list string (see add_valuesets), the
+            strings which are not in it are parsed (parse_valueset).
+    """
     correspondence = 0.0
     if valuedatelist1 and valuedatelist2:
         if (valuedatelist1 != "") or (valuedatelist2 != ""):
-            valuedatelist1_obj = ValueDateList(valuedatelist1)
-            valuedatelist2_obj = ValueDateList(valuedatelist2)
-            if valuedatelist2_obj.HasValueIn(valuedatelist1_obj):
+            valueset1 = valuesets.get(valuedatelist1) if valuesets else None
+            if valueset1 is None:
+                valueset1 = parse_valueset(valuedatelist1)
+            valueset2 = valuesets.get(valuedatelist2) if valuesets else None
+            if valueset2 is None:
+                valueset2 = parse_valueset(valuedatelist2)
+            if not valueset2.isdisjoint(valueset1):
                 correspondence = 1.0    
     return correspondence
 
 
+###################################################################
+#
+# Gramps XML Element Functions
+#
+###################################################################
+
+class GrampsTags:
+    """ Namespace qualified tag names of the Gramps XML elements that are
+        read, composed once instead of for every findall.
+    """
+    def __init__(self, xmlns):
+        self.xmlns = xmlns
+        self.events = xmlns+"events"
+        self.event = xmlns+"event"
+        self.type = xmlns+"type"
+        self.dateval = xmlns+"dateval"
+        self.families = xmlns+"families"
+        self.family = xmlns+"family"
+        self.father = xmlns+"father"
+        self.mother = xmlns+"mother"
+        self.childref = xmlns+"childref"
+        self.people = xmlns+"people"
+        self.person = xmlns+"person"
+        self.gender = xmlns+"gender"
+        self.name = xmlns+"name"
+        self.surname = xmlns+"surname"
+        self.attribute = xmlns+"attribute"
+        self.eventref = xmlns+"eventref"
+        self.childof = xmlns+"childof"
+        self.parentin = xmlns+"parentin"
+
+# These functions read the few attributes which are needed from
+# an event, family or person element. They are shared by the
+# DOM and the streaming extraction, which clears the element as
+# soon as it has been read.
+
+def get_hlink_tuple(elem, tag: str) -> tuple:
+    return tuple(handle for handle in
+                 (child_elem.get("hlink") for child_elem in elem.iterchildren(tag))
+                 if handle)
+
+def get_birth_event_from_elem(event_elem, tags: GrampsTags) -> BirthEvent:
+    birth_event = None
+    # get type of event
+    event_type = None
+    event_type_elem = event_elem.find(tags.type)
+    if event_type_elem is not None:
+        event_type = event_type_elem.text
+    if event_type == 'Birth':
+        # get dateval
+        dateval_elem = event_elem.find(tags.dateval)
+        if dateval_elem is not None:
+            birth_event = BirthEvent(event_elem.get('handle'),
+                                     dateval_elem.get('val'), dateval_elem.get('type'))
+    return birth_event
+
+def get_family_from_elem(family_elem, tags: GrampsTags) -> Family:
+    # get father
+    father = None
+    father_elem = family_elem.find(tags.father)
+    if father_elem is not None:
+        father = father_elem.get("hlink")
+    # get mother
+    mother = None
+    mother_elem = family_elem.find(tags.mother)
+    if mother_elem is not None:
+        mother = mother_elem.get("hlink")
+    # get children
+    childrefs_tuple = tuple(childref_elem.get("hlink")
+                            for childref_elem in family_elem.iterchildren(tags.childref))
+    return Family(family_elem.get('handle'), father, mother, childrefs_tuple)
+
+def get_person_record_from_elem(person_elem, tags: GrampsTags) -> tuple:
+    """ Read all person data needed by get_person_list and
+        get_occupation_list. The references to events and families
+        are kept as handles and are resolved by get_person_list.
+    """
+    # get gender
+    gender = None
+    gender_elem = person_elem.find(tags.gender)
+    if gender_elem is not None:
+        gender = gender_elem.text
+    # get name_list
+    name_dict = []
+    for name_elem in person_elem.iterchildren(tags.name):
+        name = None
+        # get prefix(es) and surname(s)
+        for surname_elem in name_elem.iterchildren(tags.surname):
+            prefix = surname_elem.get('prefix')
+            surname = surname_elem.text
+            # set name (= first + [prefix + surname])
+            if prefix:
+                if name:
+                    name = name + " " + prefix
+                else:
+                    name = prefix
+            if surname:
+                if name:
+                    name = name + " " + surname
+                else:
+                    name = surname
+        if name:
+            name_dict.append(name)
+
+    # get attributes Occupation and Residence
+    occupation = None
+    residence = None
+    occupation_list = []
+    for attribute_elem in person_elem.iterchildren(tags.attribute):
+        # attributes of any type, so also the Occupation and Residence
+        # types, could technically occur more than once. But these
+        # are, in principle, imput only once. If not (arbitrarely)
+        # took the last.
+        attribute_type = attribute_elem.get('type')
+        attribute_value = attribute_elem.get('value')
+        if attribute_type == 'Beroep':
+            occupation = attribute_value
+            # all occupations are kept for get_occupation_list
+            occupation_list.append(attribute_value)
+        elif attribute_type == 'Woonplaats':
+            residence = attribute_value
+
+    return (person_elem.get('handle'), person_elem.get('id'), tuple(name_dict), gender,
+            residence, occupation, tuple(occupation_list),
+            get_hlink_tuple(person_elem, tags.eventref),
+            get_hlink_tuple(person_elem, tags.childof),
+            get_hlink_tuple(person_elem, tags.parentin))
+
+def clear_elem(elem):
+    # free the memory of an element that has been read, including
+    # the already processed siblings that preceded it
+    elem.clear(keep_tail=True)
+    parent = elem.getparent()
+    if parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
+
+class GrampsTables:
+    """ The birth events, families and person records of a Gramps XML
+        family tree, extracted in one pass over the document.
+    """
+    def __init__(self, xmlns):
+        self.tags = GrampsTags(xmlns)
+        self.birth_event_list = []
+        self.family_list = []
+        self.person_record_list = []
+        self._birth_event_index = None
+        self._family_index = None
+
+    def __getstate__(self):
+        # the indexes are rebuilt when needed
+        state = dict(self.__dict__)
+        state['_birth_event_index'] = None
+        state['_family_index'] = None
+        return state
+
+    def get_birth_event_index(self) -> HandleIndex:
+        if self._birth_event_index is None:
+            self._birth_event_index = HandleIndex(self.birth_event_list, COL_EVENT_HANDLE)
+        return self._birth_event_index
+
+    def get_family_index(self) -> HandleIndex:
+        if self._family_index is None:
+            self._family_index = HandleIndex(self.family_list, COL_FAMILY_HANDLE)
+        return self._family_index
+
+    def add_record(self, section_tag: str, elem):
+        # elem is a record (event, family, person, ...) within the section
+        # (events, families, people, ...) with the tag section_tag
+        tags = self.tags
+        tag = elem.tag
+        if tag == tags.person:
+            if section_tag == tags.people:
+                self.person_record_list.append(get_person_record_from_elem(elem, tags))
+        elif tag == tags.event:
+            if section_tag == tags.events:
+                birth_event = get_birth_event_from_elem(elem, tags)
+                if birth_event:
+                    self.birth_event_list.append(birth_event)
+        elif tag == tags.family:
+            if section_tag == tags.families:
+                self.family_list.append(get_family_from_elem(elem, tags))
+
+    @classmethod
+    def from_root(cls, root, xmlns):
+        tables = cls(xmlns)
+        for section_elem in root.iterchildren(tables.tags.events,
+                                              tables.tags.families,
+                                              tables.tags.people):
+            section_tag = section_elem.tag
+            for elem in section_elem.iterchildren():
+                tables.add_record(section_tag, elem)
+        return tables
+
+    @classmethod
+    def from_iterparse(cls, xml_filename):
+        tables = None
+        root = None
+        for event, elem in lxml.etree.iterparse(xml_filename, events=('end',)):
+            if tables is None:
+                # get root and namespace at the first (end) event
+                root = elem.getroottree().getroot()
+                xmlns = ''
+                m = re.search('{.*}', root.tag)
+                if m:
+                    xmlns = m.group(0)
+                tables = cls(xmlns)
+            # only the records (child elements of the sections under the
+            # root) are read and cleared, their sub elements are read as
+            # part of the record
+            parent = elem.getparent()
+            if parent is None or parent.getparent() is not root:
+                continue
+            tables.add_record(parent.tag, elem)
+            clear_elem(elem)
+        return tables
+
+
 ###################################################################
 #
 # Person Support Functions
 #
 ###################################################################
 
+def get_max_abs_age_delta_indays(max_abs_age_delta: int) -> int:
+    """ The largest number of days with an age delta (rounded at 2 digits,
+        see get_age_delta_inyears) within max_abs_age_delta years, or None
+        if max_abs_age_delta < 0 (no maximum)
+    """
+    if max_abs_age_delta < 0:
+        return None
+    max_days = int((max_abs_age_delta + 0.01) * 365.25) + 2
+    while round(max_days / 365.25, 2) > max_abs_age_delta:
+        max_days -= 1
+    return max_days
+
+def get_age_window_arrays(birth_sdn_list: list,
+                          include_none_dates: bool,
+                          max_abs_age_delta: int) -> (np.ndarray, np.ndarray):
+    """ For every mainperson at position mp_idx the window [lo, hi) of
+        linkpersons within max_abs_age_delta in a person_list sorted on
+        birth_date. birth_sdn_list is the julian_sdn of the birth date per
+        person or None (see get_birth_date_sdn_list).
+
+        The window is the same as searching from mp_idx DOWNWARDS and
+        UPWARDS until the first person with an age delta that's too large
+        (or an unknown birth date if include_none_dates is False). For a
+        sorted person_list it's found with two binary searches per person,
+        otherwise by searching linearly.
+    """
+    n_person = len(birth_sdn_list)
+    known = np.array([sdn is not None for sdn in birth_sdn_list], dtype=bool)
+    # sort value of an unknown birth date is 0 (see get_person_list)
+    keys = np.array([0 if sdn is None else sdn for sdn in birth_sdn_list], dtype=np.int64)
+    max_days = get_max_abs_age_delta_indays(max_abs_age_delta)
+    positions = np.arange(n_person, dtype=np.int64)
+
+    if (n_person > 1) and np.any(keys[1:] < keys[:-1]):
+        # not sorted on birth_date
+        lo = positions.copy()
+        hi = positions + 1
+        for mp_idx in range(n_person):
+            mp_sdn = birth_sdn_list[mp_idx]
+            def in_window(lp_idx):
+                lp_sdn = birth_sdn_list[lp_idx]
+                if (mp_sdn is None) or (lp_sdn is None):
+                    return include_none_dates
+                return (max_days is None) or (abs(mp_sdn - lp_sdn) <= max_days)
+            while (lo[mp_idx] > 0) and in_window(lo[mp_idx] - 1):
+                lo[mp_idx] -= 1
+            while (hi[mp_idx] < n_person) and in_window(hi[mp_idx]):
+                hi[mp_idx] += 1
+        return (lo, hi)
+
+    # first and last position with a birth date within max_days
+    if max_days is None:
+        lo_known = np.zeros(n_person, dtype=np.int64)
+        hi_known = np.full(n_person, n_person, dtype=np.int64)
+    else:
+        lo_known = np.searchsorted(keys, keys - max_days, side='left').astype(np.int64)
+        hi_known = np.searchsorted(keys, keys + max_days, side='right').astype(np.int64)
+
+    if include_none_dates:
+        # unknown birth dates are within every window, so a window ends at
+        # the first known birth date outside max_days
+        # last known position <= i
+        prev_known = np.maximum.accumulate(np.where(known, positions, -1))
+        # first known position >= i (n_person if none)
+        next_known = np.minimum.accumulate(
+            np.where(known, positions, n_person)[::-1])[::-1]
+        next_known = np.append(next_known, n_person)
+        lo = np.where(lo_known > 0, prev_known[np.maximum(lo_known - 1, 0)] + 1, 0)
+        hi = next_known[hi_known]
+        # a mainperson with an unknown birth date gets all persons
+        lo = np.where(known, lo, 0)
+        hi = np.where(known, hi, n_person)
+    else:
+        # a window ends at the first unknown birth date
+        # last unknown position < i
+        prev_unknown = np.maximum.accumulate(np.where(known, -1, positions))
+        prev_unknown = np.append(-1, prev_unknown[:-1])
+        # first unknown position > i (n_person if none)
+        next_unknown = np.minimum.accumulate(
+            np.where(known, n_person, positions)[::-1])[::-1]
+        next_unknown = np.append(next_unknown[1:], n_person)
+        lo = np.maximum(lo_known, prev_unknown + 1)
+        hi = np.minimum(hi_known, next_unknown)
+        # a mainperson with an unknown birth date gets no persons
+        lo = np.where(known, lo, positions)
+        hi = np.where(known, hi, positions + 1)
+    return (lo, hi)
+
+class PersonIndex(HandleIndex):
+    """ Index (person handle -> position in the person_list), built once
+        from a person_list and shared by get_connection_list and user code.
+        get_index(handle) returns the position or None and get(handle)
+        returns (person, position).
+    """
+    def __init__(self, person_list: list):
+        super().__init__(person_list, COL_PERSON_HANDLE)
+
+def add_occupation_table_index(kwargs_features: dict) -> dict:
+    """ Return a copy of kwargs_features with the handle index of the
+        occupation_table added as 'occupation_table_index', so the index
+        is built once and not in every MLFeatureOccupationCorrespondence call
+    """
+    occupation_table = kwargs_features.get('occupation_table')
+    if (occupation_table is not None) and \
+       (kwargs_features.get('occupation_table_index') is None):
+        kwargs_features = dict(kwargs_features)
+        kwargs_features['occupation_table_index'] = HandleIndex(
+            occupation_table, COL_OCCUPATION_TABLE_OCCUPATION)
+    return kwargs_features
+
+def get_relative_counts(relatives: tuple) -> (int, int):
+    """ The number of siblings ('Broer/zus') and children ('Kind') in the
+        relatives of a person
+    """
+    nsiblings = 0
+    nchildren = 0
+    for relative in relatives:
+        linktype = relative[COL_RELATIVE_LINKTYPE]
+        if linktype == 'Broer/zus':
+            nsiblings += 1
+        elif linktype == 'Kind':
+            nchildren += 1
+    return (nsiblings, nchildren)
+
+def add_relative_counts(kwargs_features: dict, person_list: list,
+                        mlfeature_list: list, person_relative_counts: dict = None) -> dict:
+    """ Return a copy of kwargs_features with the relative counts (see
+        get_relative_counts) per person handle added as 'relative_counts',
+        if the NSiblingsEquality feature is used and no counts are given.
+        The person_relative_counts (counted by get_person_list) are used if
+        they have the counts of all persons, otherwise they are counted.
+    """
+    if kwargs_features.get('relative_counts') is None:
+        for mlfeature in mlfeature_list:
+            if mlfeature.get_name().lower() == "nsiblingsequality":
+                kwargs_features = dict(kwargs_features)
+                if (person_relative_counts is not None) and \
+                   all(person[COL_PERSON_HANDLE] in person_relative_counts for person in person_list):
+                    kwargs_features['relative_counts'] = person_relative_counts
+                else:
+                    kwargs_features['relative_counts'] = {
+                        person[COL_PERSON_HANDLE]: get_relative_counts(person[COL_PERSON_RELATIVES_TUPLE])
+                        for person in person_list}
+                break
+    return kwargs_features
+
+def add_valuesets(kwargs_features: dict, person_list: list,
+                  mlfeature_list: list) -> dict:
+    """ Return a copy of kwargs_features with the valuesets (see
+        parse_valueset) of the residences and occupations in the person_list
+        added as 'valuesets', a dict per value date list string, if the
+        ResidenceCorrespondence feature or the OccupationCorrespondence
+        feature without the occupation_table is used and no valuesets are given
+    """
+    if kwargs_features.get('valuesets') is None:
+        columns = []
+        for mlfeature in mlfeature_list:
+            mlfeature_name = mlfeature.get_name().lower()
+            if mlfeature_name == "residencecorrespondence":
+                columns.append(COL_PERSON_RESIDENCE)
+            elif (mlfeature_name == "occupationcorrespondence") and \
+                 (not kwargs_features.get('use_occupation_table')):
+                columns.append(COL_PERSON_OCCUPATION)
+        if columns:
+            valuesets = {}
+            for person in person_list:
+                for column in columns:
+                    valueasstring = person[column]
+                    if valueasstring and (valueasstring not in valuesets):
+                        valuesets[valueasstring] = parse_valueset(valueasstring)
+            kwargs_features = dict(kwargs_features)
+            kwargs_features['valuesets'] = valuesets
+    return kwargs_features
+
 def create_personlink(args: tuple) -> tuple:
     # This person suppert function is defined outside the
     # MGGrampsConnect object because otherwise it cam't be
@@ -517,6 +1179,1700 @@ def create_personlink(args: tuple) -> tuple:
 
     return personlink
 
+class ConnectionWorkerState(NamedTuple):
+    """ The read-only state which every worker of the connection pool gets
+        once (see StatePool)
+    """
+    mlfeature_list: list
+    linktype_mode: str
+    name_similarity_mode: tuple
+    include_none_dates: bool
+    max_abs_age_delta: int
+    person_list: list
+    person_index: HandleIndex
+    kwargs_features: dict
+
+def draw_random_connection_handles(person_list: list, random_connections_per_person: int) -> list:
+    """ The handles of the random linkpersons of every mainperson, drawn from
+        the random module in the order of the serial loop over the person_list
+    """
+    n_person = len(person_list)
+    random_handle_list = []
+    for mainperson in person_list:
+        mainperson_relatives_tuple = mainperson[COL_PERSON_RELATIVES_TUPLE]
+        random_handles = []
+        # Check whether the list is long enough to get the desired unique random items
+        # Otherwise the while loop will not end in finding unique items
+        # TODO the randomly chosen handle(s) could (or shuold) also be made unique
+        if (random_connections_per_person - 1) < (n_person - len(mainperson_relatives_tuple)):
+            for conn_pp in range(random_connections_per_person):
+                random_person_handle = get_random_handle_from_list(person_list, COL_PERSON_HANDLE)
+                while random_person_handle in mainperson_relatives_tuple:
+                    random_person_handle = get_random_handle_from_list(person_list, COL_PERSON_HANDLE)
+                random_handles.append(random_person_handle)
+        random_handle_list.append(random_handles)
+    return random_handle_list
+
+def get_connection(state: ConnectionWorkerState, mp_idx: int, mainperson,
+                   lp_idx: int, linkperson, linktype: str) -> tuple:
+    """ The connection with all feature values, or None if a feature has
+        no valid value
+    """
+    connection = (mp_idx, lp_idx, linktype)
+    # calc all feature values for this specific connection_list
+    result = False
+    for mlfeature in state.mlfeature_list:
+        featurevalue, result = mlfeature.get_value(mainperson, linkperson, linktype,
+            name_similarity_mode=state.name_similarity_mode,
+            include_none_dates=state.include_none_dates,
+            max_abs_age_delta=state.max_abs_age_delta,
+            **state.kwargs_features)
+        if result:
+            connection = connection + (featurevalue,)
+        else:
+            # Stop the loop and dan't add the connection
+            break
+    # Only the connections for which all features returns a valid value
+    return connection if result else None
+
+def create_mainperson_connections(state: ConnectionWorkerState, mp_start: int, mp_end: int,
+                                  random_handle_list: list) -> (list, list):
+    """ The connections of the mainpersons [mp_start, mp_end) and the
+        (number of known, number of random) connections per mainperson,
+        random_handle_list has the random linkpersons of these mainpersons
+        (see draw_random_connection_handles) or is None
+    """
+    person_list = state.person_list
+    person_index = state.person_index
+    neutral_linktypes = state.linktype_mode.lower() == "neutral"
+    connection_list = []
+    connection_count_list = []
+    for mp_idx in range(mp_start, mp_end):
+        mainperson = person_list[mp_idx]
+
+        # -----------------------------
+        # add known connections
+        # -----------------------------
+
+        # init the number of known connections for the current mainperson
+        n_person_known_connection = 0
+
+        # add all relatives as linkpersons from the maainperson
+        for mainperson_relative in mainperson[COL_PERSON_RELATIVES_TUPLE]:
+            # get the linkperson data from the person list
+            linkperson, lp_idx = person_index.get(mainperson_relative[COL_RELATIVE_PERSON_HANDLE])
+            # a linkperson could not be found in the person_list for instance when
+            # include_none_date = True and the birth_date of the linkperson is unknown
+            if linkperson:
+                # get linktype between mainperson and linkperson
+                linktype = mainperson_relative[COL_RELATIVE_LINKTYPE]
+                # in person is "ByGender" the default setting for linktype
+                # map linktype to gender neutral omes in the case of taht linktype_mode
+                if neutral_linktypes:
+                    if linktype == "Vader":
+                        linktype = "Ouder"                
+                    elif linktype == "Moeder":
+                        linktype = "Ouder"                
+                    elif linktype == "Man":
+                        linktype = "Echtgeno(o)t(e)"                
+                    elif linktype == "Vrouw":
+                        linktype = "Echtgeno(o)t(e)"
+
+                connection = get_connection(state, mp_idx, mainperson, lp_idx, linkperson, linktype)
+                # Only add the connections for which all features returns a valid value
+                if connection is not None:
+                    connection_list.append(connection)
+                    n_person_known_connection += 1
+
+        # -----------------------------
+        # add random connections
+        # -----------------------------
+
+        # init the number of random connections for the current mainperson
+        n_person_random_connection = 0
+
+        if random_handle_list is not None:
+            for random_person_handle in random_handle_list[mp_idx - mp_start]:
+                # get the linkperson data from the person list
+                linkperson, lp_idx = person_index.get(random_person_handle)
+                # a check on the existance of linkperson isn't necessary because
+                # it's chose from the available ones.
+                connection = get_connection(state, mp_idx, mainperson, lp_idx, linkperson, "Onbekend")
+                # Only add the connections fro which all features returns a valid value
+                if connection is not None:
+                    connection_list.append(connection)
+                    n_person_random_connection += 1
+
+        connection_count_list.append((n_person_known_connection, n_person_random_connection))
+    return (connection_list, connection_count_list)
+
+class PersonlinkWorkerState(NamedTuple):
+    """ The read-only state which every worker of the personlink pool gets
+        once (see StatePool)
+    """
+    mlfeature_list: list
+    name_similarity_mode: tuple
+    include_none_dates: bool
+    max_abs_age_delta: int
+    person_list: list
+    birth_sdn_list: list
+    linktype_values: list
+    kwargs_features: dict
+    connection_graph: object = None
+    name_index: object = None
+    age_window_lo: list = None
+    age_window_hi: list = None
+
+def get_linkperson_index_list(state: PersonlinkWorkerState, mp_idx: int) -> list:
+    """ The linkpersons of mainperson mp_idx in the order of the search: from
+        mp_idx DOWNWARDS and then UPWARDS till max_abs_age_delta
+    """
+    lo = state.age_window_lo[mp_idx]
+    hi = state.age_window_hi[mp_idx]
+    # The search from mp_idx DOWNWARDS and UPWARDS also ends at the
+    # first linkperson that belongs to the connection_list
+    lo, hi = state.connection_graph.get_window_without_links(mp_idx, lo, hi)
+    if state.name_index is None:
+        return itertools.chain(range(mp_idx - 1, lo - 1, -1), range(mp_idx + 1, hi))
+    return state.name_index.get_window_candidates(
+        mp_idx, state.person_list[mp_idx][COL_PERSON_NAME_LIST],
+        state.name_similarity_mode, lo, hi)
+
+def get_personlink(state: PersonlinkWorkerState, mp_idx: int, lp_idx: int, linktype,
+                   mainperson=None, linkperson=None) -> tuple:
+    # mainperson and linkperson: the persons at mp_idx and lp_idx, if
+    # they are already taken from the person_list
+    if mainperson is None:
+        mainperson = state.person_list[mp_idx]
+    if linkperson is None:
+        linkperson = state.person_list[lp_idx]
+    # get age delta in years (from the precomputed birth dates, this
+    # is the value of MLFeatureAgeDelta)
+    age_delta, result = get_age_delta_inyears_from_sdn(
+        state.birth_sdn_list[lp_idx], state.birth_sdn_list[mp_idx],
+        accept_none_dates=state.include_none_dates,
+        max_abs_age_delta=state.max_abs_age_delta)
+    return create_personlink((state.mlfeature_list,
+                              state.name_similarity_mode,
+                              state.include_none_dates,
+                              state.max_abs_age_delta,
+                              mp_idx, mainperson,
+                              lp_idx, linkperson,
+                              linktype, age_delta,
+                              state.kwargs_features))
+
+def create_personlink_tasks(state: PersonlinkWorkerState, task_array: np.ndarray) -> list:
+    """ The personlinks of a chunk of tasks (mp_idx, lp_idx, linktype_code),
+        the linktype_code is an index into the linktype_values of the
+        state (-1: None). Every person is taken once per chunk from the
+        person_list, because for a SharedPersonTable that means building
+        the Person record.
+    """
+    person_list = state.person_list
+    linktype_values = state.linktype_values
+    personlink_list = []
+    # the tasks are ordered by mp_idx
+    mainperson_idx = None
+    mainperson = None
+    linkperson_cache = {}
+    for mp_idx, lp_idx, linktype_code in task_array.tolist():
+        if mp_idx != mainperson_idx:
+            mainperson_idx = mp_idx
+            mainperson = linkperson_cache.get(mp_idx)
+            if mainperson is None:
+                mainperson = person_list[mp_idx]
+        linkperson = linkperson_cache.get(lp_idx)
+        if linkperson is None:
+            linkperson = person_list[lp_idx]
+            linkperson_cache[lp_idx] = linkperson
+        personlink = get_personlink(state, mp_idx, lp_idx,
+                                    linktype_values[linktype_code] if linktype_code >= 0 else None,
+                                    mainperson, linkperson)
+        if personlink:
+            personlink_list.append(personlink)
+    return personlink_list
+
+def create_mainperson_personlinks(state: PersonlinkWorkerState, mp_start: int, mp_end: int) -> list:
+    """ The personlinks of the mainpersons [mp_start, mp_end)
+    """
+    personlink_list = []
+    if state.age_window_lo is None:
+        return personlink_list
+    for mp_idx in range(mp_start, mp_end):
+        for lp_idx in get_linkperson_index_list(state, mp_idx):
+            personlink = get_personlink(state, mp_idx, lp_idx,
+                                        state.connection_graph.get_linktype(mp_idx, lp_idx))
+            if personlink:
+                personlink_list.append(personlink)
+    return personlink_list
+
+def create_mainperson_shard(state: PersonlinkWorkerState, mp_start: int, mp_end: int) -> (tuple, list):
+    # as create_mainperson_personlinks, with the range of the mainpersons
+    return ((mp_start, mp_end), create_mainperson_personlinks(state, mp_start, mp_end))
+
+def get_pool_size(n_proc: int) -> int:
+    # n_proc < 0: all available processors, otherwise at most n_proc
+    n_cpu = multiprocessing.cpu_count()
+    if n_proc < 0:
+        return n_cpu
+    return min(n_proc, n_cpu)
+
+
+###################################################################
+#
+# Worker Pools
+#
+###################################################################
+
+# The state of a worker of a StatePool
+_worker_state = None
+
+def init_worker_state(state):
+    # Pool initializer: with the fork start method the state is inherited
+    # by the worker (copy-on-write), otherwise it's pickled once per worker
+    global _worker_state
+    _worker_state = state
+
+def run_worker_task(task: tuple):
+    # task: (function, args), function(state, *args) with the state of the worker
+    function, args = task
+    return function(_worker_state, *args)
+
+class StatePool:
+    """ Pool of n_pool processes which get a read-only state once and run the
+        tasks function(state, *args) (function should be a module function).
+        The processes are stopped when it's closed, it's a context manager.
+    """
+    def __init__(self, n_pool: int, state):
+        self.pool = Pool(n_pool, initializer=init_worker_state, initargs=(state,))
+
+    def map(self, function, args_list: list) -> list:
+        # the results in the order of the args_list
+        return self.pool.map(run_worker_task, [(function, args) for args in args_list], chunksize=1)
+
+    def imap_unordered(self, function, args_iterable):
+        # the results in the order in which they are ready
+        return self.pool.imap_unordered(run_worker_task, ((function, args) for args in args_iterable))
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+def get_reference_tables(person_list: list, kwargs_features: dict) -> tuple:
+    # the tables which are the same for all calls of a WorkerSession
+    return (person_list,) + tuple(value for value in kwargs_features.values()
+                                  if isinstance(value, (list, tuple)))
+
+# The directory, reference tables and states of a worker of a WorkerSession
+_session_dir = None
+_session_references = {}
+_session_states = {}
+# The number of states a worker of a WorkerSession keeps
+_SESSION_STATE_CACHE_SIZE = 2
+
+class _SessionPickler(pickle.Pickler):
+    # pickles the reference tables of a WorkerSession by their id
+    def __init__(self, file, references: dict):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.references = references
+
+    def persistent_id(self, obj):
+        reference = self.references.get(id(obj))
+        if (reference is not None) and (reference[1] is obj):
+            return reference[0]
+        return None
+
+class _SessionUnpickler(pickle.Unpickler):
+    def persistent_load(self, reference_id):
+        return get_session_reference(reference_id)
+
+def init_session_worker(session_dir: str, reference_ids: list):
+    # Pool initializer of a WorkerSession, loads the reference tables
+    global _session_dir
+    _session_dir = session_dir
+    _session_references.clear()
+    _session_states.clear()
+    for reference_id in reference_ids:
+        get_session_reference(reference_id)
+
+def get_session_reference(reference_id: str):
+    reference = _session_references.get(reference_id)
+    if reference is None:
+        with open(os.path.join(_session_dir, reference_id + ".pickle"), 'rb') as f:
+            reference = pickle.load(f)
+        _session_references[reference_id] = reference
+    return reference
+
+def get_session_state(state_id: str):
+    state = _session_states.get(state_id)
+    if state is None:
+        with open(os.path.join(_session_dir, state_id + ".pickle"), 'rb') as f:
+            state = _SessionUnpickler(f).load()
+        while len(_session_states) >= _SESSION_STATE_CACHE_SIZE:
+            del _session_states[next(iter(_session_states))]
+        _session_states[state_id] = state
+    return state
+
+def run_session_task(task: tuple):
+    # task: (state_id, function, args), function(state, *args)
+    state_id, function, args = task
+    return function(get_session_state(state_id), *args)
+
+class SessionStatePool:
+    """ A state in the pool of a WorkerSession, with the methods of StatePool.
+        Closing it removes the state, not the pool.
+    """
+    def __init__(self, session, state_id: str):
+        self.session = session
+        self.state_id = state_id
+
+    def map(self, function, args_list: list) -> list:
+        return self.session.pool.map(run_session_task, [(self.state_id, function, args)
+                                                        for args in args_list], chunksize=1)
+
+    def imap_unordered(self, function, args_iterable):
+        return self.session.pool.imap_unordered(run_session_task, ((self.state_id, function, args)
+                                                                   for args in args_iterable))
+
+    def close(self):
+        self.session.remove_state(self.state_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+class WorkerSession:
+    """ A pool of processes which is kept for several calls of get_connection_list,
+        get_personlink_list, iter_personlinks and get_personlink_list_checkpointed
+        (see MLGrampsConnect.session), instead of a new pool per call.
+
+        The state of a call is written once to a directory of the session and
+        every worker reads it at its first task. In this state the reference
+        tables (the person_list and the tables of kwargs_features, see
+        get_reference_tables) are only referred to: they are written once
+        per session and every worker keeps them, so they are not sent again
+        for the next call. A reference table shouldn't be changed while the
+        session is open. The reference_tables are loaded by the workers when
+        they start.
+
+        The session is a context manager: at the end the pool is closed and
+        joined (terminated after an exception) and the directory is removed.
+    """
+    def __init__(self, n_proc: int = -1, reference_tables: tuple = ()):
+        self.n_pool = get_pool_size(n_proc)
+        self.session_dir = tempfile.mkdtemp(prefix="mlgrampsconnect_")
+        self.references = {}
+        self.n_state = 0
+        self.pool = None
+        try:
+            reference_ids = self.add_reference_tables(reference_tables)
+            # the workers share the resource tracker of this process, otherwise
+            # (python < 3.13, the workers are forked before a SharedPersonTable
+            # is created) each starts its own when it attaches to a
+            # SharedPersonTable, which then unlinks the block that the worker
+            # doesn't own and reports it as leaked
+            resource_tracker.ensure_running()
+            self.pool = Pool(self.n_pool, initializer=init_session_worker,
+                             initargs=(self.session_dir, reference_ids))
+        except BaseException:
+            shutil.rmtree(self.session_dir, ignore_errors=True)
+            raise
+
+    def add_reference_tables(self, reference_tables: tuple) -> list:
+        """ Write the tables which are not written yet, return their ids
+        """
+        reference_ids = []
+        for table in reference_tables:
+            reference = self.references.get(id(table))
+            if (reference is None) or (reference[1] is not table):
+                reference = ("reference_{}".format(len(self.references)), table)
+                write_file_atomic(self.session_dir, reference[0] + ".pickle",
+                                  pickle.dumps(table, protocol=pickle.HIGHEST_PROTOCOL))
+                # the table is kept, so its id is not used again
+                self.references[id(table)] = reference
+            reference_ids.append(reference[0])
+        return reference_ids
+
+    def open_state(self, state, reference_tables: tuple = ()) -> SessionStatePool:
+        """ Write the state (with the reference_tables by their id) for the tasks
+            of a call
+        """
+        if self.pool is None:
+            raise ValueError("The WorkerSession is closed")
+        self.add_reference_tables(reference_tables)
+        state_id = "state_{}".format(self.n_state)
+        self.n_state += 1
+        fd, tmp_filename = tempfile.mkstemp(dir=self.session_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                _SessionPickler(f, self.references).dump(state)
+            os.replace(tmp_filename, os.path.join(self.session_dir, state_id + ".pickle"))
+        except BaseException:
+            os.remove(tmp_filename)
+            raise
+        return SessionStatePool(self, state_id)
+
+    def remove_state(self, state_id: str):
+        try:
+            os.remove(os.path.join(self.session_dir, state_id + ".pickle"))
+        except FileNotFoundError:
+            pass
+
+    def close(self, terminate: bool = False):
+        if self.pool is not None:
+            if terminate:
+                self.pool.terminate()
+            else:
+                self.pool.close()
+            self.pool.join()
+            self.pool = None
+        self.references = {}
+        shutil.rmtree(self.session_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(terminate=exc_type is not None)
+        return False
+
+
+###################################################################
+#
+# Surname Distance Cache
+#
+###################################################################
+
+class SurnameCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+class SurnameDistanceCache:
+    """ Levenshtein distances between the surnames (COL_PERSON_NAME_LIST) of a
+        person_list. Every distinct name gets an integer id and the distance
+        of a pair of ids is calculated once. For a vocabulary of at most
+        matrix_max_names names the distances are kept in a matrix (filled on
+        demand), otherwise in a dictionary of at most maxsize pairs (the oldest
+        pairs are dropped first). Names which are not in the vocabulary are
+        never cached.
+
+        hits and misses count the lookups (see cache_info). When the cache is
+        passed to other processes (multiprocessing) only the vocabulary is
+        passed, so every process has its own distances and counters. A worker
+        keeps them as long as its state (see StatePool and WorkerSession); the
+        per-pair tasks of pool_mode 'PerTask' don't get the cache at all.
+    """
+    def __init__(self, names=(), maxsize: int = 1 << 20, matrix_max_names: int = 1024):
+        self.name_ids = {}
+        for name in names:
+            if name not in self.name_ids:
+                self.name_ids[name] = len(self.name_ids)
+        self.maxsize = maxsize
+        self.use_matrix = len(self.name_ids) <= matrix_max_names
+        self._reset()
+
+    @classmethod
+    def from_person_list(cls, person_list: list, **kwargs):
+        return cls((name for person in person_list for name in person[COL_PERSON_NAME_LIST]), **kwargs)
+
+    def _reset(self):
+        self.hits = 0
+        self.misses = 0
+        self.currsize = 0
+        self._matrix = None
+        self._distances = {}
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.update(hits=0, misses=0, currsize=0, _matrix=None, _distances={})
+        return state
+
+    def clear(self):
+        self._reset()
+
+    def cache_info(self) -> SurnameCacheInfo:
+        if self.use_matrix:
+            maxsize = len(self.name_ids) * (len(self.name_ids) + 1) // 2
+        else:
+            maxsize = self.maxsize
+        return SurnameCacheInfo(self.hits, self.misses, maxsize, self.currsize)
+
+    def get_distance(self, name_a: str, name_b: str) -> int:
+        name_ids = self.name_ids
+        id_a = name_ids.get(name_a)
+        id_b = name_ids.get(name_b)
+        if (id_a is None) or (id_b is None):
+            self.misses += 1
+            return Levenshtein._levenshtein.distance(name_a, name_b)
+        # the distance is symmetric, so (id_a, id_b) and (id_b, id_a) share a key
+        if id_a > id_b:
+            key = id_b * len(name_ids) + id_a
+        else:
+            key = id_a * len(name_ids) + id_b
+        if self.use_matrix:
+            if self._matrix is None:
+                self._matrix = array.array('i', [-1]) * (len(name_ids) * len(name_ids))
+            distance = self._matrix[key]
+            if distance >= 0:
+                self.hits += 1
+                return distance
+            self.misses += 1
+            distance = Levenshtein._levenshtein.distance(name_a, name_b)
+            self._matrix[key] = distance
+            self.currsize += 1
+            return distance
+        distance = self._distances.get(key)
+        if distance is not None:
+            self.hits += 1
+            return distance
+        self.misses += 1
+        distance = Levenshtein._levenshtein.distance(name_a, name_b)
+        if len(self._distances) >= self.maxsize:
+            del self._distances[next(iter(self._distances))]
+        else:
+            self.currsize += 1
+        self._distances[key] = distance
+        return distance
+
+def add_surname_distance_cache(kwargs_features: dict, person_list: list,
+                               mlfeature_list: list) -> dict:
+    """ Return a copy of kwargs_features with a SurnameDistanceCache of the
+        person_list added as 'surname_distance_cache', if the
+        SurnameSimilarity feature is used and no cache is given
+    """
+    if kwargs_features.get('surname_distance_cache') is None:
+        for mlfeature in mlfeature_list:
+            if mlfeature.get_name().lower() == "surnamesimilarity":
+                kwargs_features = dict(kwargs_features)
+                kwargs_features['surname_distance_cache'] = \
+                    SurnameDistanceCache.from_person_list(person_list)
+                break
+    return kwargs_features
+
+
+###################################################################
+#
+# Occupation Codebook
+#
+###################################################################
+
+def get_occupation_word_list(occupation: str,
+                             occupation_replacement_table: list,
+                             filter_lists: tuple) -> list:
+    """ The lowercase words of occupation after the replacements, without
+        duplicates and words of the filter_lists (stopwords, places and
+        excluded occupation words)
+    """
+    occupation_list = []
+    occupation = replace_words(occupation_replacement_table, occupation)
+    # split occupation string in words
+    for occupation_word in occupation.split():
+        occupation_list.append(occupation_word.lower())
+    # Filter duplicates and words from (in this order) stop_words_list,
+    # place_words_list and occupation_exclude_words_list
+    return filter_duplicates_and_special_words(filter_lists, occupation_list)
+
+class OccupationNormalizer:
+    """ get_occupation_word_list compiled for one replacement table and set
+        of filter lists (see TextNormalizer), with the filter lists as
+        frozensets. The word lists are cached per occupation.
+    """
+    def __init__(self, occupation_replacement_table: list,
+                 stopword_words_list: list,
+                 place_words_list: list,
+                 occupation_exclude_words_list: list,
+                 maxsize: int = 1 << 16):
+        self.text_normalizer = TextNormalizer(occupation_replacement_table)
+        self.filter_sets = (frozenset(stopword_words_list),
+                            frozenset(place_words_list),
+                            frozenset(occupation_exclude_words_list))
+        self.maxsize = maxsize
+        self._cache = {}
+
+    @classmethod
+    def from_kwargs_features(cls, kwargs_features: dict):
+        return cls(kwargs_features['occupation_replacement_table'],
+                   kwargs_features['stopword_words_list'],
+                   kwargs_features['place_words_list'],
+                   kwargs_features['occupation_exclude_words_list'])
+
+    def get_word_list(self, occupation: str) -> list:
+        word_tuple = self._cache.get(occupation)
+        if word_tuple is None:
+            occupation_list = [occupation_word.lower() for occupation_word in
+                               self.text_normalizer.replace_words(occupation).split()]
+            word_tuple = tuple(filter_duplicates_and_special_words(self.filter_sets, occupation_list))
+            if len(self._cache) >= self.maxsize:
+                self._cache.clear()
+            if self.maxsize > 0:
+                self._cache[occupation] = word_tuple
+        return list(word_tuple)
+
+# The correspondence of the best pair of occupation words, the values are
+# added in the same order as in MLFeatureOccupationCorrespondence to get
+# exactly the same floats (word 0.10, profession 0.10, sector 0.80)
+_OCCUPATION_SCORE_WORD_PROFESSION_SECTOR = 0.0 + 0.10 + 0.10 + 0.80
+_OCCUPATION_SCORE_PROFESSION_SECTOR = 0.0 + 0.10 + 0.80
+_OCCUPATION_SCORE_WORD_SECTOR = 0.0 + 0.10 + 0.80
+_OCCUPATION_SCORE_SECTOR = 0.0 + 0.80
+_OCCUPATION_SCORE_WORD_PROFESSION = 0.0 + 0.10 + 0.10
+_OCCUPATION_SCORE_WORD = 0.0 + 0.10
+_OCCUPATION_SCORE_PROFESSION = 0.0 + 0.10
+
+class OccupationMasks(NamedTuple):
+    """ Bitsets (int) of the words of an occupation, by the kind of word, and
+        of its professions, sectors and (profession, sector) pairs
+    """
+    words_profession_sector: int
+    words_sector: int
+    words_profession: int
+    words_other: int
+    profession_sectors: int
+    professions: int
+    sectors: int
+
+class OccupationCodebook:
+    """ Occupations (COL_PERSON_OCCUPATION) normalized once into tuples of
+        codes (word_id, profession_id, sector_id), one per word, where the
+        profession and sector are those of the first row of the
+        occupation_table with that word (-1 if there is none or if it is
+        empty), and into OccupationMasks.
+
+        The correspondence of two occupations is the best correspondence of a
+        pair of their words. A word determines its profession and sector, so
+        the best pair follows from the shared bits (see get_mask_correspondence)
+        instead of comparing all pairs of words.
+
+        The ids and masks of a process are consistent with each other, but not
+        with those of another process.
+    """
+    def __init__(self, occupation_table: list,
+                 occupation_replacement_table: list,
+                 stopword_words_list: list,
+                 place_words_list: list,
+                 occupation_exclude_words_list: list):
+        self.occupation_normalizer = OccupationNormalizer(
+            occupation_replacement_table, stopword_words_list,
+            place_words_list, occupation_exclude_words_list)
+        self.words = Vocabulary()
+        self.professions = Vocabulary()
+        self.sectors = Vocabulary()
+        self.profession_sectors = Vocabulary()
+        # occupation word -> (profession_id, sector_id)
+        self.word_codes = {}
+        for occupation_itm in occupation_table:
+            word = occupation_itm[COL_OCCUPATION_TABLE_OCCUPATION]
+            if word not in self.word_codes:
+                profession = occupation_itm[COL_OCCUPATION_TABLE_PROFESSION]
+                sector = occupation_itm[COL_OCCUPATION_TABLE_SECTOR]
+                self.word_codes[word] = (self.professions.get_id(profession) if profession else -1,
+                                         self.sectors.get_id(sector) if sector else -1)
+        # the distinct occupations with their codes and masks
+        self.occupations = Vocabulary()
+        self._occupation_codes = []
+        self._occupation_masks = []
+
+    @classmethod
+    def from_kwargs_features(cls, kwargs_features: dict):
+        return cls(kwargs_features['occupation_table'],
+                   kwargs_features['occupation_replacement_table'],
+                   kwargs_features['stopword_words_list'],
+                   kwargs_features['place_words_list'],
+                   kwargs_features['occupation_exclude_words_list'])
+
+    def get_occupation_id(self, occupation: str) -> int:
+        """ The id of the (normalized) occupation, -1 if occupation is empty
+        """
+        if not occupation:
+            return -1
+        n_occupations = len(self.occupations)
+        occupation_id = self.occupations.get_id(occupation)
+        if occupation_id == n_occupations:
+            code_list = []
+            masks = [0] * len(OccupationMasks._fields)
+            for word in self.occupation_normalizer.get_word_list(occupation):
+                profession_id, sector_id = self.word_codes.get(word, (-1, -1))
+                word_id = self.words.get_id(word)
+                code_list.append((word_id, profession_id, sector_id))
+                if (profession_id >= 0) and (sector_id >= 0):
+                    masks[0] |= 1 << word_id
+                    masks[4] |= 1 << self.profession_sectors.get_id((profession_id, sector_id))
+                elif sector_id >= 0:
+                    masks[1] |= 1 << word_id
+                elif profession_id >= 0:
+                    masks[2] |= 1 << word_id
+                else:
+                    masks[3] |= 1 << word_id
+                if profession_id >= 0:
+                    masks[5] |= 1 << profession_id
+                if sector_id >= 0:
+                    masks[6] |= 1 << sector_id
+            self._occupation_codes.append(tuple(code_list))
+            self._occupation_masks.append(OccupationMasks(*masks))
+        return occupation_id
+
+    def get_codes(self, occupation: str) -> tuple:
+        occupation_id = self.get_occupation_id(occupation)
+        if occupation_id < 0:
+            return ()
+        return self._occupation_codes[occupation_id]
+
+    def get_masks(self, occupation: str) -> OccupationMasks:
+        occupation_id = self.get_occupation_id(occupation)
+        if occupation_id < 0:
+            return OccupationMasks(0, 0, 0, 0, 0, 0, 0)
+        return self._occupation_masks[occupation_id]
+
+    def get_person_occupation_ids(self, person_list: list) -> np.ndarray:
+        """ The occupation id of every person (-1 without occupation), this
+            also normalizes the occupations of all persons in advance
+        """
+        return np.array([self.get_occupation_id(person[COL_PERSON_OCCUPATION])
+                         for person in person_list], dtype=np.int64)
+
+    def add_person_list(self, person_list: list):
+        """ Normalize the occupations of all persons in advance
+        """
+        self.get_person_occupation_ids(person_list)
+
+    @staticmethod
+    def get_mask_correspondence(main_masks: OccupationMasks, link_masks: OccupationMasks) -> float:
+        """ The correspondence of the best pair of words, from the highest to
+            the lowest possible value
+        """
+        if main_masks.words_profession_sector & link_masks.words_profession_sector:
+            return _OCCUPATION_SCORE_WORD_PROFESSION_SECTOR
+        if main_masks.profession_sectors & link_masks.profession_sectors:
+            return _OCCUPATION_SCORE_PROFESSION_SECTOR
+        if main_masks.words_sector & link_masks.words_sector:
+            return _OCCUPATION_SCORE_WORD_SECTOR
+        if main_masks.sectors & link_masks.sectors:
+            return _OCCUPATION_SCORE_SECTOR
+        if main_masks.words_profession & link_masks.words_profession:
+            return _OCCUPATION_SCORE_WORD_PROFESSION
+        if main_masks.words_other & link_masks.words_other:
+            return _OCCUPATION_SCORE_WORD
+        if main_masks.professions & link_masks.professions:
+            return _OCCUPATION_SCORE_PROFESSION
+        return 0.0
+
+    def get_correspondence(self, mainperson_occupation: str, linkperson_occupation: str) -> float:
+        """ The best correspondence of a word of mainperson_occupation and a
+            word of linkperson_occupation: 0.10 for the same word, 0.10 for the
+            same profession and 0.80 for the same sector
+        """
+        return self.get_mask_correspondence(self.get_masks(mainperson_occupation),
+                                            self.get_masks(linkperson_occupation))
+
+    def get_correspondence_array(self, main_occupation_ids: np.ndarray,
+                                 link_occupation_ids: np.ndarray) -> np.ndarray:
+        """ The correspondence of arrays of pairs of occupation ids (see
+            get_person_occupation_ids), every distinct pair is evaluated once
+        """
+        main_occupation_ids = np.asarray(main_occupation_ids, dtype=np.int64)
+        link_occupation_ids = np.asarray(link_occupation_ids, dtype=np.int64)
+        # shift by one for the -1 (no occupation)
+        n_ids = len(self.occupations) + 1
+        pair_keys, inverse = np.unique((main_occupation_ids + 1) * n_ids + (link_occupation_ids + 1),
+                                       return_inverse=True)
+        no_masks = OccupationMasks(0, 0, 0, 0, 0, 0, 0)
+        masks_list = [no_masks] + self._occupation_masks
+        pair_values = np.array([self.get_mask_correspondence(masks_list[main_key], masks_list[link_key])
+                                for main_key, link_key in zip(*divmod(pair_keys, n_ids))],
+                               dtype=np.float64)
+        return pair_values[inverse.reshape(-1)]
+
+def add_occupation_codebook(kwargs_features: dict, person_list: list,
+                            mlfeature_list: list) -> dict:
+    """ Return a copy of kwargs_features with an OccupationCodebook of the
+        person_list added as 'occupation_codebook', if the
+        OccupationCorrespondence feature is used with the occupation_table and
+        no codebook is given
+    """
+    if kwargs_features.get('use_occupation_table') and \
+       (kwargs_features.get('occupation_codebook') is None):
+        for mlfeature in mlfeature_list:
+            if mlfeature.get_name().lower() == "occupationcorrespondence":
+                occupation_codebook = OccupationCodebook.from_kwargs_features(kwargs_features)
+                occupation_codebook.add_person_list(person_list)
+                kwargs_features = dict(kwargs_features)
+                kwargs_features['occupation_codebook'] = occupation_codebook
+                break
+    return kwargs_features
+
+
+###################################################################
+#
+# Name Blocking
+#
+###################################################################
+
+# The pad character of the q-grams, it should not occur in names
+_QGRAM_PAD = '\x00'
+
+def get_qgram_counts(name: str, q: int) -> dict:
+    """ The padded q-grams of name with their number of occurrences, a name
+        of length n has n + q - 1 q-grams
+    """
+    padded_name = _QGRAM_PAD * (q - 1) + name + _QGRAM_PAD * (q - 1)
+    qgram_counts = {}
+    for i in range(len(padded_name) - q + 1):
+        qgram = padded_name[i:i + q]
+        qgram_counts[qgram] = qgram_counts.get(qgram, 0) + 1
+    return qgram_counts
+
+def get_name_max_distance(name_similarity_mode: tuple, name: str) -> int:
+    """ The largest Levenshtein distance between name (of the mainperson) and
+        a name of the linkperson that still passes the threshold of
+        name_similarity_mode (see MLFeatureSurnameSimilarity), None if no
+        distance passes
+    """
+    similarity_method = name_similarity_mode[0]
+    if similarity_method in ('LevenshteinDistance', 'LevenshteinDistanceBool'):
+        return name_similarity_mode[1]
+    if similarity_method == 'LevenshteinDistanceRelative':
+        return len(name)
+    return None
+
+class BKTree:
+    """ Burkhard-Keller tree of names with the Levenshtein distance as metric.
+        search(name, max_distance) only visits the subtrees which can contain
+        names within max_distance (triangle inequality), instead of computing
+        the distance to every name.
+    """
+    def __init__(self, names=()):
+        # a node is (name, {distance: child node})
+        self.root = None
+        self.names = set()
+        self._within_cache = {}
+        for name in names:
+            self.add(name)
+
+    def __contains__(self, name) -> bool:
+        return name in self.names
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_within_cache'] = {}
+        return state
+
+    def add(self, name: str):
+        if name in self.names:
+            return
+        self.names.add(name)
+        self._within_cache.clear()
+        if self.root is None:
+            self.root = (name, {})
+            return
+        node = self.root
+        while True:
+            node_name, children = node
+            distance = Levenshtein._levenshtein.distance(name, node_name)
+            child = children.get(distance)
+            if child is None:
+                children[distance] = (name, {})
+                return
+            node = child
+
+    def search(self, name: str, max_distance: int) -> list:
+        """ [(distance, name), ...] of all names within max_distance of name
+        """
+        result = []
+        if self.root is None:
+            return result
+        node_stack = [self.root]
+        while node_stack:
+            node_name, children = node_stack.pop()
+            distance = Levenshtein._levenshtein.distance(name, node_name)
+            if distance <= max_distance:
+                result.append((distance, node_name))
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    node_stack.append(child)
+        return result
+
+    def get_names_within(self, name: str, max_distance: int) -> frozenset:
+        """ The (cached) set of names within max_distance of name
+        """
+        key = (name, max_distance)
+        names_within = self._within_cache.get(key)
+        if names_within is None:
+            names_within = frozenset(node_name for distance, node_name in self.search(name, max_distance))
+            if len(self._within_cache) >= 1 << 16:
+                self._within_cache.clear()
+            self._within_cache[key] = names_within
+        return names_within
+
+    def has_name_within(self, name: str, other_name_list: tuple, max_distance: int) -> bool:
+        """ True if any of other_name_list is within max_distance of name
+        """
+        names_within = None
+        for other_name in other_name_list:
+            if other_name in self.names:
+                if names_within is None:
+                    names_within = self.get_names_within(name, max_distance)
+                if other_name in names_within:
+                    return True
+            elif Levenshtein._levenshtein.distance(name, other_name) <= max_distance:
+                return True
+        return False
+
+class NameIndex(abc.ABC):
+    """ The distinct names (COL_PERSON_NAME_LIST) in a person_list with the
+        persons per name, for blocking the pairs of persons in
+        get_personlink_list. Only the pairs with at least one pair of names
+        that passes the threshold of the name_similarity_mode are candidates.
+        Subclasses find the names within a maximum distance of a name
+        (get_candidate_name_ids).
+    """
+    def __init__(self, person_list: list):
+        self.name_values = []
+        self.name_ids = {}
+        name_person_index_lists = []
+        for person_idx, person in enumerate(person_list):
+            for name in person[COL_PERSON_NAME_LIST]:
+                name_id = self.name_ids.get(name)
+                if name_id is None:
+                    name_id = len(self.name_values)
+                    self.name_ids[name] = name_id
+                    self.name_values.append(name)
+                    name_person_index_lists.append([])
+                person_index_list = name_person_index_lists[name_id]
+                if (not person_index_list) or (person_index_list[-1] != person_idx):
+                    person_index_list.append(person_idx)
+        # the (ascending) positions in the person_list of the persons per name
+        self.name_person_index = [np.array(person_index_list, dtype=np.int64)
+                                  for person_index_list in name_person_index_lists]
+        self._candidate_cache = {}
+
+    @abc.abstractmethod
+    def get_candidate_name_ids(self, name: str, max_distance: int) -> list:
+        """ The ids of the names within max_distance of name
+        """
+
+    def get_candidate_person_index(self, name_list: tuple, name_similarity_mode: tuple) -> np.ndarray:
+        """ The ascending positions in the person_list of the persons with a
+            name that passes name_similarity_mode with one of the names in
+            name_list
+        """
+        key = (name_list, name_similarity_mode)
+        person_index = self._candidate_cache.get(key)
+        if person_index is None:
+            name_id_set = set()
+            for name in name_list:
+                name_id_set.update(self.get_candidate_name_ids(
+                    name, get_name_max_distance(name_similarity_mode, name)))
+            if name_id_set:
+                person_index = np.unique(np.concatenate(
+                    [self.name_person_index[name_id] for name_id in name_id_set]))
+            else:
+                person_index = np.zeros(0, dtype=np.int64)
+            if len(self._candidate_cache) >= 1 << 12:
+                self._candidate_cache.clear()
+            self._candidate_cache[key] = person_index
+        return person_index
+
+    def get_window_candidates(self, mp_idx: int, name_list: tuple,
+                              name_similarity_mode: tuple, lo: int, hi: int) -> list:
+        """ The candidate linkpersons of mainperson mp_idx within the window
+            [lo, hi) in the order of the search: from mp_idx DOWNWARDS and
+            then UPWARDS
+        """
+        person_index = self.get_candidate_person_index(name_list, name_similarity_mode)
+        lo_pos, mp_pos, hi_pos = np.searchsorted(person_index, (lo, mp_idx, hi)).tolist()
+        down = person_index[lo_pos:mp_pos].tolist()
+        down.reverse()
+        up = person_index[mp_pos:hi_pos].tolist()
+        if up and (up[0] == mp_idx):
+            del up[0]
+        return down + up
+
+class QGramNameIndex(NameIndex):
+    """ NameIndex with an inverted index of the q-grams of the names.
+
+        Two names within Levenshtein distance k share at least
+        max(len_a, len_b) + q - 1 - k * q q-grams (count filter) and their
+        lengths differ at most k (length filter). The names passing both
+        filters are verified with the exact distance, so with min_overlap 0
+        the blocking is lossless: exactly the pairs with a passing pair of
+        names remain.
+
+        min_overlap is the recall/speed knob: names also have to share at least
+        min_overlap q-grams, this skips short and very different names (which
+        hardly share q-grams) and with that also some passing pairs. With
+        'LevenshteinDistanceRelative' the maximum distance is the length of the
+        name of the mainperson, so the count filter only blocks with a
+        min_overlap > 0.
+    """
+    def __init__(self, person_list: list, q: int = 2, min_overlap: int = 0):
+        super().__init__(person_list)
+        self.q = q
+        self.min_overlap = min_overlap
+        # q-gram -> [(name_id, count), ...] and length -> [name_id, ...]
+        self.postings = {}
+        self.length_name_ids = {}
+        for name_id, name in enumerate(self.name_values):
+            for qgram, count in get_qgram_counts(name, q).items():
+                self.postings.setdefault(qgram, []).append((name_id, count))
+            self.length_name_ids.setdefault(len(name), []).append(name_id)
+
+    def get_candidate_name_ids(self, name: str, max_distance: int) -> list:
+        """ The ids of the names within max_distance of name (and sharing at
+            least min_overlap q-grams)
+        """
+        if max_distance is None:
+            return []
+        q = self.q
+        name_length = len(name)
+        overlap_counts = {}
+        for qgram, count in get_qgram_counts(name, q).items():
+            for name_id, other_count in self.postings.get(qgram, ()):
+                overlap_counts[name_id] = overlap_counts.get(name_id, 0) + min(count, other_count)
+        candidate_name_ids = []
+        for name_id, overlap_count in overlap_counts.items():
+            other_length = len(self.name_values[name_id])
+            if (abs(name_length - other_length) <= max_distance) and \
+               (overlap_count >= self.min_overlap) and \
+               (overlap_count >= max(name_length, other_length) + q - 1 - max_distance * q):
+                candidate_name_ids.append(name_id)
+        if self.min_overlap <= 0:
+            # names without a shared q-gram pass the count filter too if they
+            # are short enough
+            for other_length, name_id_list in self.length_name_ids.items():
+                if (abs(name_length - other_length) <= max_distance) and \
+                   (max(name_length, other_length) + q - 1 - max_distance * q <= 0):
+                    candidate_name_ids.extend(name_id for name_id in name_id_list
+                                              if name_id not in overlap_counts)
+        # verify the candidates
+        return [name_id for name_id in candidate_name_ids
+                if Levenshtein._levenshtein.distance(name, self.name_values[name_id]) <= max_distance]
+
+class BKTreeNameIndex(NameIndex):
+    """ NameIndex with a BKTree of the names, the candidates are exactly the
+        names within the maximum distance
+    """
+    def __init__(self, person_list: list):
+        super().__init__(person_list)
+        self.bktree = BKTree(self.name_values)
+
+    def get_candidate_name_ids(self, name: str, max_distance: int) -> list:
+        if max_distance is None:
+            return []
+        return [self.name_ids[node_name] for distance, node_name in self.bktree.search(name, max_distance)]
+
+
+###################################################################
+#
+# Person Table
+#
+###################################################################
+
+GENDER_VALUES = ('M', 'F', 'U')
+
+class Vocabulary:
+    """ Distinct values in order of first appearance, each with an integer id
+    """
+    def __init__(self, values=()):
+        self.values = []
+        self.ids = {}
+        for value in values:
+            self.get_id(value)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, id):
+        return self.values[id]
+
+    def get_id(self, value) -> int:
+        id = self.ids.get(value)
+        if id is None:
+            id = len(self.values)
+            self.ids[value] = id
+            self.values.append(value)
+        return id
+
+class PersonTable:
+    """ Columnar store of a person_list in NumPy arrays. Strings are stored
+        once in a list of values (..._values) and referred to by integer
+        ids, -1 means None. The list of names and the relatives of person i
+        are in the CSR arrays at [offsets[i]:offsets[i+1]].
+
+        handle_values: the handles of the persons at their position in the
+            table, followed by the handles of relatives that are not in it
+        id_values: the person ids
+        name_offsets, name_ids: names (into name_values) per person
+        gender_codes: uint8 codes into gender_values
+        birth_date_known: the birth date can be used to calculate an age
+        birth_sdn: int32 serial date number of the birth date (0 if unknown)
+        birth_dateval_ids, birth_datetype_ids: the birth_date (val, type)
+            into dateval_values and datetype_values (-1: birth_date None)
+        residence_ids, occupation_ids: into residence_values and
+            occupation_values
+        relative_offsets: relatives per person
+        relative_index: position of the relative in the table (-1 if not)
+        relative_handle_ids: into handle_values
+        relative_family_ids: into family_handle_values
+        relative_linktype_codes: uint8 codes into linktype_values
+        nsiblings, nchildren: uint16 number of 'Broer/zus' and 'Kind'
+            relatives per person (see get_relative_counts)
+
+        Convert with PersonTable.from_person_list(person_list) and
+        to_person_list().
+    """
+    def __init__(self):
+        self.n_person = 0
+        self.handle_values = []
+        self.id_values = []
+        self.name_values = []
+        self.name_offsets = np.zeros(1, dtype=np.int64)
+        self.name_ids = np.zeros(0, dtype=np.int32)
+        self.gender_values = list(GENDER_VALUES)
+        self.gender_codes = np.zeros(0, dtype=np.uint8)
+        self.dateval_values = []
+        self.datetype_values = []
+        self.birth_date_known = np.zeros(0, dtype=bool)
+        self.birth_sdn = np.zeros(0, dtype=np.int32)
+        self.birth_dateval_ids = np.zeros(0, dtype=np.int32)
+        self.birth_datetype_ids = np.zeros(0, dtype=np.int32)
+        self.residence_values = []
+        self.residence_ids = np.zeros(0, dtype=np.int32)
+        self.occupation_values = []
+        self.occupation_ids = np.zeros(0, dtype=np.int32)
+        self.family_handle_values = []
+        self.linktype_values = list(linktypes('ByGender', include_unknown=False))
+        self.relative_offsets = np.zeros(1, dtype=np.int64)
+        self.relative_index = np.zeros(0, dtype=np.int32)
+        self.relative_handle_ids = np.zeros(0, dtype=np.int32)
+        self.relative_family_ids = np.zeros(0, dtype=np.int32)
+        self.relative_linktype_codes = np.zeros(0, dtype=np.uint8)
+        self.nsiblings = np.zeros(0, dtype=np.uint16)
+        self.nchildren = np.zeros(0, dtype=np.uint16)
+        self._handle_index = None
+
+    def __len__(self):
+        return self.n_person
+
+    @classmethod
+    def from_person_list(cls, person_list: list):
+        table = cls()
+        n_person = len(person_list)
+
+        # the handles of the persons get the ids 0..n_person-1, so a
+        # relative's handle id is its position when it's in the table
+        handle_values = [person[COL_PERSON_HANDLE] for person in person_list]
+        handle_ids = {}
+        for i in range(n_person):
+            handle_ids.setdefault(handle_values[i], i)
+
+        name_vocabulary = Vocabulary()
+        gender_vocabulary = Vocabulary(table.gender_values)
+        dateval_vocabulary = Vocabulary()
+        datetype_vocabulary = Vocabulary()
+        residence_vocabulary = Vocabulary()
+        occupation_vocabulary = Vocabulary()
+        family_handle_vocabulary = Vocabulary()
+        linktype_vocabulary = Vocabulary(table.linktype_values)
+
+        name_offsets = [0]
+        name_ids = []
+        gender_codes = []
+        birth_date_known = []
+        birth_dates = []
+        birth_dateval_ids = []
+        birth_datetype_ids = []
+        residence_ids = []
+        occupation_ids = []
+        relative_offsets = [0]
+        relative_handle_ids = []
+        relative_family_ids = []
+        relative_linktype_codes = []
+
+        for person in person_list:
+            for name in person[COL_PERSON_NAME_LIST]:
+                name_ids.append(name_vocabulary.get_id(name))
+            name_offsets.append(len(name_ids))
+
+            gender_codes.append(gender_vocabulary.get_id(person[COL_PERSON_GENDER]))
+
+            birth_date = person[COL_PERSON_BIRTH_DATE]
+            if birth_date:
+                birth_dateval_ids.append(dateval_vocabulary.get_id(birth_date[0]))
+                birth_datetype_ids.append(datetype_vocabulary.get_id(birth_date[1]))
+                known = bool(birth_date[0])
+            else:
+                birth_dateval_ids.append(-1)
+                birth_datetype_ids.append(-1)
+                known = False
+            birth_date_known.append(known)
+            birth_dates.append(birth_date[0] if known else None)
+
+            residence = person[COL_PERSON_RESIDENCE]
+            residence_ids.append(-1 if residence is None else residence_vocabulary.get_id(residence))
+            occupation = person[COL_PERSON_OCCUPATION]
+            occupation_ids.append(-1 if occupation is None else occupation_vocabulary.get_id(occupation))
+
+            for relative in person[COL_PERSON_RELATIVES_TUPLE]:
+                relative_handle = relative[COL_RELATIVE_PERSON_HANDLE]
+                handle_id = handle_ids.get(relative_handle)
+                if handle_id is None:
+                    handle_id = len(handle_values)
+                    handle_ids[relative_handle] = handle_id
+                    handle_values.append(relative_handle)
+                relative_handle_ids.append(handle_id)
+                relative_family_ids.append(family_handle_vocabulary.get_id(
+                    relative[COL_RELATIVE_FAMILY_HANDLE]))
+                relative_linktype_codes.append(linktype_vocabulary.get_id(
+                    relative[COL_RELATIVE_LINKTYPE]))
+            relative_offsets.append(len(relative_handle_ids))
+
+        table.n_person = n_person
+        table.handle_values = handle_values
+        table.id_values = [person[COL_PERSON_ID] for person in person_list]
+        table.name_values = name_vocabulary.values
+        table.name_offsets = np.array(name_offsets, dtype=np.int64)
+        table.name_ids = np.array(name_ids, dtype=np.int32)
+        table.gender_values = gender_vocabulary.values
+        table.gender_codes = np.array(gender_codes, dtype=np.uint8)
+        table.dateval_values = dateval_vocabulary.values
+        table.datetype_values = datetype_vocabulary.values
+        table.birth_date_known = np.array(birth_date_known, dtype=bool)
+        table.birth_sdn = get_date_sort_values(birth_dates).astype(np.int32)
+        table.birth_dateval_ids = np.array(birth_dateval_ids, dtype=np.int32)
+        table.birth_datetype_ids = np.array(birth_datetype_ids, dtype=np.int32)
+        table.residence_values = residence_vocabulary.values
+        table.residence_ids = np.array(residence_ids, dtype=np.int32)
+        table.occupation_values = occupation_vocabulary.values
+        table.occupation_ids = np.array(occupation_ids, dtype=np.int32)
+        table.family_handle_values = family_handle_vocabulary.values
+        table.linktype_values = linktype_vocabulary.values
+        table.relative_offsets = np.array(relative_offsets, dtype=np.int64)
+        table.relative_handle_ids = np.array(relative_handle_ids, dtype=np.int32)
+        table.relative_index = np.where(table.relative_handle_ids < n_person,
+                                        table.relative_handle_ids, -1).astype(np.int32)
+        table.relative_family_ids = np.array(relative_family_ids, dtype=np.int32)
+        table.relative_linktype_codes = np.array(relative_linktype_codes, dtype=np.uint8)
+        relative_counts = [get_relative_counts(person[COL_PERSON_RELATIVES_TUPLE])
+                           for person in person_list]
+        table.nsiblings = np.array([counts[0] for counts in relative_counts], dtype=np.uint16)
+        table.nchildren = np.array([counts[1] for counts in relative_counts], dtype=np.uint16)
+        return table
+
+    def get_index(self, handle) -> int:
+        # position of the person with the handle in the table (or None)
+        if self._handle_index is None:
+            self._handle_index = {}
+            for i in range(self.n_person):
+                self._handle_index.setdefault(self.handle_values[i], i)
+        return self._handle_index.get(handle)
+
+    def get_person(self, i: int) -> Person:
+        name_list = tuple(self.name_values[name_id] for name_id in
+                          self.name_ids[self.name_offsets[i]:self.name_offsets[i+1]].tolist())
+        birth_date = None
+        dateval_id = int(self.birth_dateval_ids[i])
+        if dateval_id >= 0:
+            birth_date = (self.dateval_values[dateval_id],
+                          self.datetype_values[self.birth_datetype_ids[i]])
+        residence_id = int(self.residence_ids[i])
+        residence = self.residence_values[residence_id] if residence_id >= 0 else None
+        occupation_id = int(self.occupation_ids[i])
+        occupation = self.occupation_values[occupation_id] if occupation_id >= 0 else None
+        relative_start = self.relative_offsets[i]
+        relative_end = self.relative_offsets[i+1]
+        relatives = tuple(
+            Relative(self.family_handle_values[family_id], self.handle_values[handle_id],
+                     self.linktype_values[linktype_code])
+            for family_id, handle_id, linktype_code in zip(
+                self.relative_family_ids[relative_start:relative_end].tolist(),
+                self.relative_handle_ids[relative_start:relative_end].tolist(),
+                self.relative_linktype_codes[relative_start:relative_end].tolist()))
+        return Person(self.handle_values[i], self.id_values[i], name_list,
+                      self.gender_values[self.gender_codes[i]], birth_date,
+                      residence, occupation, relatives)
+
+    def to_person_list(self) -> list:
+        return [self.get_person(i) for i in range(self.n_person)]
+
+    def get_nbytes(self) -> int:
+        # memory used by the NumPy columns (without the ..._values lists)
+        return sum(value.nbytes for value in vars(self).values()
+                   if isinstance(value, np.ndarray))
+
+
+###################################################################
+#
+# Shared Person Table
+#
+###################################################################
+
+# The columns in the block of shared memory start at a multiple of
+_SHARED_COLUMN_ALIGNMENT = 64
+
+def get_handle_hash(handle: str) -> int:
+    # the same in every process (unlike hash(), which is salted per process)
+    return zlib.crc32(handle.encode('utf-8'))
+
+class PackedStrings:
+    """ Read-only list of strings (or None) packed in NumPy arrays: the UTF-8
+        bytes of value i are data[offsets[i]:offsets[i+1]] and is_none[i] marks
+        the value None. The strings are decoded when they are read.
+    """
+    def __init__(self, data: np.ndarray, offsets: np.ndarray, is_none: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+        self.is_none = is_none
+        self._buffer = memoryview(data)
+
+    @staticmethod
+    def pack(values: list) -> (np.ndarray, np.ndarray, np.ndarray):
+        encoded = [b'' if value is None else value.encode('utf-8') for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(value) for value in encoded], dtype=np.int64)
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        is_none = np.array([value is None for value in values], dtype=bool)
+        return (data, offsets, is_none)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if self.is_none[i]:
+            return None
+        return str(self._buffer[self.offsets[i]:self.offsets[i+1]], 'utf-8')
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+class NullableColumn:
+    """ Read-only list view of a NumPy column with None where known is False
+    """
+    def __init__(self, values: np.ndarray, known: np.ndarray):
+        self.values = values
+        self.known = known
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        return int(self.values[i]) if self.known[i] else None
+
+class SharedRelativeCounts:
+    """ The (number of siblings, number of children) per person handle of a
+        SharedPersonTable, get(handle) as the dict of add_relative_counts
+    """
+    def __init__(self, shared_table):
+        self.shared_table = shared_table
+
+    def get(self, handle, default=None):
+        i = self.shared_table.get_index(handle)
+        if i is None:
+            return default
+        table = self.shared_table.table
+        return (int(table.nsiblings[i]), int(table.nchildren[i]))
+
+class SharedPersonTable:
+    """ A PersonTable in one block of shared memory (multiprocessing.shared_memory),
+        so the processes of a pool read the same columns instead of having
+        their own copy of the person_list.
+
+        The parent creates the block with SharedPersonTable.create(person_table)
+        and removes it with unlink(), or by using it as a context manager.
+        Pickled (for instance as initargs of a pool) it's only the name of the
+        block and the layout of the columns: the worker attaches to the block
+        and its NumPy columns and lists of values (PackedStrings) are views
+        on it, nothing is copied.
+
+        table: the PersonTable of the views
+        len() and [i]: the persons as Person records (PersonTable.get_person),
+            so it can be used as the person_list of the personlink workers
+        get_index(handle): position of the person (or None), by a hash index
+            which is in the block too
+    """
+    def __init__(self, shm: shared_memory.SharedMemory, layout: list, n_person: int,
+                 owner: bool = False):
+        self.shm = shm
+        self.layout = layout
+        self.n_person = n_person
+        self.owner = owner
+        self._set_views()
+
+    def _set_views(self):
+        columns = {}
+        for key, dtype, shape, offset in self.layout:
+            column = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+            column.flags.writeable = False
+            columns[key] = column
+        table = PersonTable()
+        table.n_person = self.n_person
+        for key, column in columns.items():
+            attr, _, part = key.partition('.')
+            if not part:
+                setattr(table, attr, column)
+            elif part == 'data':
+                setattr(table, attr, PackedStrings(column, columns[attr + '.offsets'],
+                                                   columns[attr + '.is_none']))
+        self.table = table
+        self.handle_hash = columns['_handle_hash']
+        self.handle_order = columns['_handle_order']
+
+    @classmethod
+    def create(cls, person_table: PersonTable):
+        """ Copy the columns of the person_table into a new block
+        """
+        columns = {}
+        for attr, value in vars(person_table).items():
+            if attr.startswith('_'):
+                continue
+            if isinstance(value, np.ndarray):
+                columns[attr] = value
+            elif isinstance(value, list):
+                data, offsets, is_none = PackedStrings.pack(value)
+                columns[attr + '.data'] = data
+                columns[attr + '.offsets'] = offsets
+                columns[attr + '.is_none'] = is_none
+        # the persons ordered by the hash of their handle, equal hashes in the
+        # order of the table (the first person with a handle is found)
+        handle_hash = np.array([get_handle_hash(handle) for handle in
+                                person_table.handle_values[:person_table.n_person]], dtype=np.uint32)
+        handle_order = np.argsort(handle_hash, kind='stable').astype(np.int32)
+        columns['_handle_hash'] = handle_hash[handle_order]
+        columns['_handle_order'] = handle_order
+
+        layout = []
+        size = 0
+        for key, column in columns.items():
+            size = -(-size // _SHARED_COLUMN_ALIGNMENT) * _SHARED_COLUMN_ALIGNMENT
+            layout.append((key, column.dtype.str, column.shape, size))
+            size += column.nbytes
+
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            for key, dtype, shape, offset in layout:
+                np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)[...] = columns[key]
+            return cls(shm, layout, person_table.n_person, owner=True)
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+
+    @classmethod
+    def from_person_list(cls, person_list: list):
+        return cls.create(PersonTable.from_person_list(person_list))
+
+    def __getstate__(self):
+        return {'name': self.shm.name, 'layout': self.layout, 'n_person': self.n_person}
+
+    def __setstate__(self, state):
+        self.shm = shared_memory.SharedMemory(name=state['name'])
+        self.layout = state['layout']
+        self.n_person = state['n_person']
+        self.owner = False
+        self._set_views()
+
+    def __len__(self):
+        return self.n_person
+
+    def __getitem__(self, i) -> Person:
+        return self.table.get_person(i)
+
+    def get_index(self, handle) -> int:
+        if handle is None:
+            return None
+        handle_hash = get_handle_hash(handle)
+        k = int(np.searchsorted(self.handle_hash, handle_hash))
+        while (k < self.n_person) and (self.handle_hash[k] == handle_hash):
+            i = int(self.handle_order[k])
+            if self.table.handle_values[i] == handle:
+                return i
+            k += 1
+        return None
+
+    def get_birth_sdn_list(self) -> NullableColumn:
+        # as get_birth_date_sdn_list(person_list)
+        return NullableColumn(self.table.birth_sdn, self.table.birth_date_known)
+
+    def get_relative_counts(self) -> SharedRelativeCounts:
+        # as kwargs_features['relative_counts'] of add_relative_counts
+        return SharedRelativeCounts(self)
+
+    def close(self):
+        """ Detach from the block (the views can't be used anymore)
+        """
+        self.table = None
+        self.handle_hash = None
+        self.handle_order = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # a column is still referred to, the block is detached when
+            # that view is released
+            pass
+
+    def unlink(self):
+        """ Remove the block (by the parent), the processes which are
+            attached can still read it until they close it
+        """
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.owner:
+            self.unlink()
+        else:
+            self.close()
+        return False
+
+
+###################################################################
+#
+# Connection Graph
+#
+###################################################################
+
+class ConnectionGraph:
+    """ The connections of a connection_list as a CSR adjacency structure.
+        The connections of the mainperson at position mp_idx are at
+        [offsets[mp_idx]:offsets[mp_idx+1]] in link_index (sorted) and
+        linktype_codes (into linktype_values). For the same pair of
+        persons the first connection in the connection_list comes first,
+        like get_value_from_list_by_dict finds it.
+    """
+    def __init__(self):
+        self.n_person = 0
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.link_index = np.zeros(0, dtype=np.int32)
+        self.linktype_values = list(linktypes('ByGender', include_unknown=True))
+        self.linktype_codes = np.zeros(0, dtype=np.uint8)
+        self._link_index_list = None
+        self._linktype_code_list = None
+
+    def __len__(self):
+        return len(self.link_index)
+
+    def __getstate__(self):
+        # the lists of _get_row_range are rebuilt on demand, they aren't
+        # passed to other processes (and aren't part of a checkpoint run key)
+        state = dict(self.__dict__)
+        state.update(_link_index_list=None, _linktype_code_list=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._link_index_list = None
+        self._linktype_code_list = None
+
+    @classmethod
+    def from_connection_list(cls, connection_list: list,
+                             person_connection_index_list: list):
+        """ person_connection_index_list (see get_connection_list) gives per
+            mainperson the start of its connections in the connection_list and
+            the number of known and random connections
+        """
+        graph = cls()
+        n_person = len(person_connection_index_list)
+        if n_person > 0:
+            person_connection_index = np.array(person_connection_index_list,
+                                               dtype=np.int64).reshape(-1, 3)
+        else:
+            person_connection_index = np.zeros((0, 3), dtype=np.int64)
+        starts = person_connection_index[:, COL_PERSON_CONNECTION_INDEX_CONNSTARTIDX]
+        counts = person_connection_index[:, COL_PERSON_CONNECTION_INDEX_NKNOWNCONN] + \
+                 person_connection_index[:, COL_PERSON_CONNECTION_INDEX_NRANDCONN]
+        offsets = np.zeros(n_person + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        n_connection = int(offsets[-1])
+
+        # position in the connection_list of every connection in the graph
+        row_main = np.repeat(np.arange(n_person, dtype=np.int64), counts)
+        row_pos = np.repeat(starts - offsets[:-1], counts) + np.arange(n_connection, dtype=np.int64)
+
+        linktype_vocabulary = Vocabulary(graph.linktype_values)
+        link_index = np.array([connection[COL_CONNECTION_LINKINDEX]
+                               for connection in connection_list], dtype=np.int64)[row_pos]
+        linktype_codes = np.array([linktype_vocabulary.get_id(connection[COL_CONNECTION_LINKTYPE])
+                                   for connection in connection_list], dtype=np.int64)[row_pos]
+
+        # sort the connections of every mainperson on link_index (stable)
+        if n_connection > 0:
+            order = np.argsort(row_main * (int(link_index.max()) + 1) + link_index, kind='stable')
+            link_index = link_index[order]
+            linktype_codes = linktype_codes[order]
+
+        graph.n_person = n_person
+        graph.offsets = offsets
+        graph.link_index = link_index.astype(np.int32)
+        graph.linktype_values = linktype_vocabulary.values
+        graph.linktype_codes = linktype_codes.astype(np.uint8)
+        return graph
+
+    def _get_row_range(self, mp_idx: int) -> (int, int):
+        # the rows as Python lists, for lookups of single pairs
+        if self._link_index_list is None:
+            self._link_index_list = self.link_index.tolist()
+            self._linktype_code_list = self.linktype_codes.tolist()
+        start = int(self.offsets[mp_idx])
+        end = int(self.offsets[mp_idx + 1])
+        return (start, end)
+
+    def get_link_index_list(self, mp_idx: int) -> list:
+        """ Sorted positions of the linkpersons of the mainperson """
+        start, end = self._get_row_range(mp_idx)
+        return self._link_index_list[start:end]
+
+    def get_linktype(self, mp_idx: int, lp_idx: int) -> str:
+        """ Linktype of the (first) connection between the mainperson and the
+            linkperson, None if there is no connection. O(log k) for a
+            mainperson with k connections.
+        """
+        start, end = self._get_row_range(mp_idx)
+        i = bisect.bisect_left(self._link_index_list, lp_idx, start, end)
+        if (i < end) and (self._link_index_list[i] == lp_idx):
+            return self.linktype_values[self._linktype_code_list[i]]
+        return None
+
+    def is_known(self, mp_idx: int, lp_idx: int) -> bool:
+        start, end = self._get_row_range(mp_idx)
+        i = bisect.bisect_left(self._link_index_list, lp_idx, start, end)
+        return (i < end) and (self._link_index_list[i] == lp_idx)
+
+    def get_window_without_links(self, mp_idx: int, lo: int, hi: int) -> (int, int):
+        """ Narrow the window [lo, hi) around mp_idx to the persons between
+            the nearest linkpersons below and above mp_idx
+        """
+        start, end = self._get_row_range(mp_idx)
+        link_index_list = self._link_index_list
+        # the last linkperson below mp_idx
+        i = bisect.bisect_left(link_index_list, mp_idx, start, end)
+        if (i > start) and (link_index_list[i - 1] >= lo):
+            lo = link_index_list[i - 1] + 1
+        # the first linkperson above mp_idx
+        i = bisect.bisect_right(link_index_list, mp_idx, start, end)
+        if (i < end) and (link_index_list[i] < hi):
+            hi = link_index_list[i]
+        return (lo, hi)
+
 
 ###################################################################
 #
@@ -524,9 +2880,25 @@ def create_personlink(args: tuple) -> tuple:
 #
 ###################################################################
 
+# The linktypes of the known relations (see MLFeatureKnownLinktype)
+_KNOWN_LINKTYPES = ("Vader", "Moeder", "Ouder",
+                    "Man", "Vrouw", "Echtgeno(o)t(e)",
+                    'Broer/zus', 'Kind')
+
+class FeatureBatch(NamedTuple):
+    """ The persons and parameters of MLFeature.get_values (see MLFeature.prepare)
+    """
+    person_list: list
+    person_table: PersonTable
+    linktype_values: list
+    name_similarity_mode: tuple
+    include_none_dates: bool
+    max_abs_age_delta: int
+    kwargs_features: dict
+
 class MLFeature:
     def __init__(self):
-        pass
+        self.feature_batch = None
 
     def get_name(self):
         return None
@@ -537,6 +2909,58 @@ class MLFeature:
     def get_value(self):
         return None
 
+    def prepare(self, person_list: list,
+                linktype_values: list,
+                name_similarity_mode: tuple,
+                include_none_dates: bool,
+                max_abs_age_delta: int,
+                person_table: PersonTable = None,
+                **kwargs_features):
+        """ Set the persons and parameters for get_values: the pairs of persons
+            are given by their positions in the person_list and the linktypes by
+            their positions in linktype_values (-1: None). The person_table
+            (PersonTable.from_person_list(person_list)) is created if it's not
+            given, pass it to share it between the features.
+        """
+        if person_table is None:
+            person_table = PersonTable.from_person_list(person_list)
+        self.feature_batch = FeatureBatch(person_list, person_table, linktype_values,
+                                          name_similarity_mode, include_none_dates,
+                                          max_abs_age_delta, kwargs_features)
+        return self
+
+    def get_values(self, main_idx_array: np.ndarray,
+                   link_idx_array: np.ndarray,
+                   linktype_codes: np.ndarray) -> (np.ndarray, np.ndarray):
+        """ The values of the pairs of persons (main_idx_array[i], link_idx_array[i])
+            with linktype linktype_codes[i] (see prepare) as a NumPy column and
+            a boolean mask which is False where get_value has no valid result.
+
+            This version calls get_value for every pair (a column of objects),
+            the features override it with a vectorized version where possible.
+        """
+        feature_batch = self.feature_batch
+        person_list = feature_batch.person_list
+        linktype_values = feature_batch.linktype_values
+        values = np.empty(len(main_idx_array), dtype=object)
+        valid = np.zeros(len(main_idx_array), dtype=bool)
+        for i, (mp_idx, lp_idx, linktype_code) in enumerate(zip(
+                np.asarray(main_idx_array).tolist(), np.asarray(link_idx_array).tolist(),
+                np.asarray(linktype_codes).tolist())):
+            values[i], valid[i] = self.get_value(
+                person_list[mp_idx], person_list[lp_idx],
+                linktype_values[linktype_code] if linktype_code >= 0 else None,
+                name_similarity_mode=feature_batch.name_similarity_mode,
+                include_none_dates=feature_batch.include_none_dates,
+                max_abs_age_delta=feature_batch.max_abs_age_delta,
+                **feature_batch.kwargs_features)
+        return (values, valid)
+
+    def get_linktype_column(self, linktype_values: list, linktype_codes: np.ndarray) -> np.ndarray:
+        # the values per linktype for the linktype_codes, the last of the
+        # linktype_values is taken for the code -1 (None)
+        return np.asarray(linktype_values)[np.asarray(linktype_codes, dtype=np.int64)]
+
 class MLFeatureAgeDelta(MLFeature):
     def __init__(self):
         super().__init__()
@@ -574,6 +2998,35 @@ class MLFeatureAgeDelta(MLFeature):
 
         return (age_delta, result)
 
+    def get_values(self, main_idx_array: np.ndarray,
+                   link_idx_array: np.ndarray,
+                   linktype_codes: np.ndarray) -> (np.ndarray, np.ndarray):
+        """ A float column, NaN where the age delta is None
+        """
+        feature_batch = self.feature_batch
+        person_table = feature_batch.person_table
+        main_idx_array = np.asarray(main_idx_array, dtype=np.int64)
+        link_idx_array = np.asarray(link_idx_array, dtype=np.int64)
+
+        known = person_table.birth_date_known[main_idx_array] & person_table.birth_date_known[link_idx_array]
+        delta_days = person_table.birth_sdn[main_idx_array].astype(np.int64) - \
+                     person_table.birth_sdn[link_idx_array]
+        # rounded as get_age_delta_inyears_from_sdn, once per distinct number of days
+        distinct_delta_days, inverse = np.unique(delta_days[known], return_inverse=True)
+        distinct_age_deltas = np.array([round(days / 365.25, 2) for days in distinct_delta_days.tolist()],
+                                       dtype=np.float64)
+        values = np.full(len(main_idx_array), np.nan)
+        values[known] = distinct_age_deltas[inverse]
+
+        if feature_batch.max_abs_age_delta < 0:
+            # Include all age_delta values
+            valid = known
+        else:
+            valid = known & (np.abs(np.where(known, values, 0.0)) <= feature_batch.max_abs_age_delta)
+        if feature_batch.include_none_dates:
+            valid = valid | ~known
+        return (values, valid)
+
 
 class MLFeatureGenderCombination(MLFeature):
     def __init__(self):
@@ -602,6 +3055,22 @@ class MLFeatureGenderCombination(MLFeature):
 
         return (gender_combination, result)
 
+    def get_values(self, main_idx_array: np.ndarray,
+                   link_idx_array: np.ndarray,
+                   linktype_codes: np.ndarray) -> (np.ndarray, np.ndarray):
+        """ A column of strings (objects)
+        """
+        person_table = self.feature_batch.person_table
+        gender_values = list(person_table.gender_values)
+        n_gender = len(gender_values)
+        gender_combinations = np.array(["{}-{}".format(mainperson_gender, linkperson_gender)
+                                        for mainperson_gender in gender_values
+                                        for linkperson_gender in gender_values], dtype=object)
+        combination_codes = person_table.gender_codes[np.asarray(main_idx_array, dtype=np.int64)].astype(np.int64) * n_gender + \
+                            person_table.gender_codes[np.asarray(link_idx_array, dtype=np.int64)]
+        values = gender_combinations[combination_codes]
+        return (values, np.ones(len(values), dtype=bool))
+
 
 class MLFeatureKnownLinktype(MLFeature):
     def __init__(self):
@@ -622,15 +3091,23 @@ class MLFeatureKnownLinktype(MLFeature):
         """
         result = True
 
-        if linktype in ("Vader", "Moeder", "Ouder",
-                        "Man", "Vrouw", "Echtgeno(o)t(e)",
-                        'Broer/zus', 'Kind'):
+        if linktype in _KNOWN_LINKTYPES:
             known_linktype = 1.0
         else:
             known_linktype = 0.0
 
         return (known_linktype, result)
 
+    def get_values(self, main_idx_array: np.ndarray,
+                   link_idx_array: np.ndarray,
+                   linktype_codes: np.ndarray) -> (np.ndarray, np.ndarray):
+        """ A float column
+        """
+        known_linktype_values = [1.0 if linktype in _KNOWN_LINKTYPES else 0.0
+                                 for linktype in self.feature_batch.linktype_values]
+        values = self.get_linktype_column(known_linktype_values + [0.0], linktype_codes)
+        return (values, np.ones(len(values), dtype=bool))
+
 
 class MLFeatureNSiblingsEquality(MLFeature):
     def __init__(self):
@@ -648,46 +3125,88 @@ class MLFeatureNSiblingsEquality(MLFeature):
                   max_abs_age_delta: int,
                   **kwargs_features):
         """ Get the equality, depending of linktype, between the number of nsiblings
+
+            kwargs_features['relative_counts']: dict (optional)
+                The (number of siblings, number of children) per person handle
+                (see add_relative_counts), otherwise they are counted.
         """
-        def get_nsiblings(relatives: tuple, linktype: str) -> int:
-            nsiblings = 0
-            for relative in relatives:
-                if relative[COL_RELATIVE_LINKTYPE] == linktype:
-                    nsiblings += 1
-            return nsiblings
+        relative_counts = kwargs_features.get('relative_counts')
+
+        def get_person_relative_counts(person) -> (int, int):
+            counts = None
+            if relative_counts is not None:
+                counts = relative_counts.get(person[COL_PERSON_HANDLE])
+            if counts is None:
+                counts = get_relative_counts(person[COL_PERSON_RELATIVES_TUPLE])
+            return counts
 
         nsiblings_equality = 0.0
         result = True
 
         if mainperson and linkperson:
-            mainperson_relatives = mainperson[COL_PERSON_RELATIVES_TUPLE]
-            linkperson_relatives = linkperson[COL_PERSON_RELATIVES_TUPLE]
+            mainperson_nsiblings, mainperson_nchildren = get_person_relative_counts(mainperson)
+            linkperson_nsiblings, linkperson_nchildren = get_person_relative_counts(linkperson)
 
             # Perhaps as a principle select and count only childs within the same
             # family group (marriage)! BUT... For a case with more family groups
             # it isn't clear which one should be taken, so as second best option:
             # just compare the total relatives of the given type.
             if linktype in ("Vader", "Moeder", "Ouder"):
-                if get_nsiblings(mainperson_relatives, "Broer/zus") + 1 == \
-                   get_nsiblings(linkperson_relatives, "Kind"):
+                if mainperson_nsiblings + 1 == linkperson_nchildren:
                     nsiblings_equality = 1.0
             elif linktype in ("Man", "Vrouw", "Echtgeno(o)t(e)"):
-                if get_nsiblings(mainperson_relatives, "Kind") == \
-                   get_nsiblings(linkperson_relatives, "Kind"):
+                if mainperson_nchildren == linkperson_nchildren:
                     nsiblings_equality = 1.0
             elif linktype == 'Broer/zus':
-                if get_nsiblings(mainperson_relatives, "Broer/zus") == \
-                   get_nsiblings(linkperson_relatives, "Broer/zus"):
+                if mainperson_nsiblings == linkperson_nsiblings:
                     nsiblings_equality = 1.0
             elif linktype == 'Kind':
-                if get_nsiblings(mainperson_relatives, "Kind") == \
-                   get_nsiblings(linkperson_relatives, "Broer/zus") + 1:
+                if mainperson_nchildren == linkperson_nsiblings + 1:
                     nsiblings_equality = 1.0
             elif linktype == 'Onbekend':
                 nsiblings_equality = 0.0
 
         return (nsiblings_equality, result)
 
+    def get_values(self, main_idx_array: np.ndarray,
+                   link_idx_array: np.ndarray,
+                   linktype_codes: np.ndarray) -> (np.ndarray, np.ndarray):
+        """ A float column, the numbers of siblings and children are those
+            of the person_table (PersonTable.nsiblings and nchildren)
+        """
+        person_table = self.feature_batch.person_table
+        main_idx_array = np.asarray(main_idx_array, dtype=np.int64)
+        link_idx_array = np.asarray(link_idx_array, dtype=np.int64)
+        mainperson_nsiblings = person_table.nsiblings[main_idx_array].astype(np.int64)
+        mainperson_nchildren = person_table.nchildren[main_idx_array].astype(np.int64)
+        linkperson_nsiblings = person_table.nsiblings[link_idx_array].astype(np.int64)
+        linkperson_nchildren = person_table.nchildren[link_idx_array].astype(np.int64)
+
+        # the kind of linktype: 1 parent, 2 partner, 3 sibling, 4 child, 0 other
+        linktype_kinds = []
+        for linktype in self.feature_batch.linktype_values:
+            if linktype in ("Vader", "Moeder", "Ouder"):
+                linktype_kinds.append(1)
+            elif linktype in ("Man", "Vrouw", "Echtgeno(o)t(e)"):
+                linktype_kinds.append(2)
+            elif linktype == 'Broer/zus':
+                linktype_kinds.append(3)
+            elif linktype == 'Kind':
+                linktype_kinds.append(4)
+            else:
+                linktype_kinds.append(0)
+        linktype_kind = self.get_linktype_column(linktype_kinds + [0], linktype_codes)
+
+        nsiblings_equality = np.select(
+            (linktype_kind == 1, linktype_kind == 2, linktype_kind == 3, linktype_kind == 4),
+            (mainperson_nsiblings + 1 == linkperson_nchildren,
+             mainperson_nchildren == linkperson_nchildren,
+             mainperson_nsiblings == linkperson_nsiblings,
+             mainperson_nchildren == linkperson_nsiblings + 1),
+            False)
+        values = nsiblings_equality.astype(np.float64)
+        return (values, np.ones(len(values), dtype=bool))
+
 
 class MLFeatureOccupationCorrespondence(MLFeature):
     def __init__(self):
@@ -705,30 +3224,29 @@ class MLFeatureOccupationCorrespondence(MLFeature):
                   max_abs_age_delta: int,
                   **kwargs_features):
 
+        """ kwargs_features['occupation_codebook']: OccupationCodebook (optional)
+                With use_occupation_table the occupations are compared by their
+                codes in this codebook.
+            kwargs_features['valuesets']: dict (optional)
+                Without use_occupation_table the valuesets of the occupations
+                (see add_valuesets).
+        """
         def get_occupation_list(occupation: str) -> list:
-            occupation_replacement_table = kwargs_features['occupation_replacement_table']
-            stopword_words_list = kwargs_features['stopword_words_list']
-            place_words_list = kwargs_features['place_words_list']
-            occupation_exclude_words_list = kwargs_features['occupation_exclude_words_list']
-
-            occupation_list = []
-            occupation = replace_words(occupation_replacement_table, occupation)
-            # split occupation string in words
-            for occupation_word in occupation.split():
-                # occupation_list.append((occupation_word.lower(),))
-                occupation_list.append(occupation_word.lower())
-
-            # Filter duplicates and words from (in this order) stop_words_list,
-            # place_words_list and occupation_exclude_words_list     
-            occupation_list = filter_duplicates_and_special_words(
-                (stopword_words_list, place_words_list, occupation_exclude_words_list),
-                occupation_list)
-            return occupation_list
+            return get_occupation_word_list(
+                occupation, kwargs_features['occupation_replacement_table'],
+                (kwargs_features['stopword_words_list'],
+                 kwargs_features['place_words_list'],
+                 kwargs_features['occupation_exclude_words_list']))
 
         # set parameter use_occupation_table
         use_occupation_table = kwargs_features['use_occupation_table']
         # set parameter occupation_table
         occupation_table = kwargs_features['occupation_table']
+        # set the handle index of the occupation_table (see
+        # add_occupation_table_index), otherwise create it
+        occupation_table_index = kwargs_features.get('occupation_table_index')
+        if use_occupation_table and (occupation_table_index is None):
+            occupation_table_index = HandleIndex(occupation_table, COL_OCCUPATION_TABLE_OCCUPATION)
         
         # seet a defaukt if the parameter was not found (or is None)
         if use_occupation_table is None:
@@ -742,13 +3260,16 @@ class MLFeatureOccupationCorrespondence(MLFeature):
         if use_occupation_table:
             occupation_correspondence = 0.0
             if mainperson_occupation and linkperson_occupation:
-                if (mainperson_occupation != "") or (linkperson_occupation != ""):
+                occupation_codebook = kwargs_features.get('occupation_codebook')
+                if occupation_codebook is not None:
+                    occupation_correspondence = occupation_codebook.get_correspondence(
+                        mainperson_occupation, linkperson_occupation)
+                elif (mainperson_occupation != "") or (linkperson_occupation != ""):
                     mainperson_occupation_list = get_occupation_list(mainperson_occupation)
                     linkperson_occupation_list = get_occupation_list(linkperson_occupation)
 
                     for main_occupation in mainperson_occupation_list:
-                        occupation_itm, occupation_idx = get_listitem_from_list_by_handle(
-                            occupation_table, main_occupation, COL_OCCUPATION_TABLE_OCCUPATION)
+                        occupation_itm, occupation_idx = occupation_table_index.get(main_occupation)
                         if not occupation_itm is None:
                             main_profession = occupation_itm[COL_OCCUPATION_TABLE_PROFESSION]
                             main_sector = occupation_itm[COL_OCCUPATION_TABLE_SECTOR]
@@ -757,8 +3278,7 @@ class MLFeatureOccupationCorrespondence(MLFeature):
                             main_sector = None
                             
                         for link_occupation in linkperson_occupation_list:
-                            occupation_itm, occupation_idx = get_listitem_from_list_by_handle(
-                                occupation_table, link_occupation, COL_OCCUPATION_TABLE_OCCUPATION)
+                            occupation_itm, occupation_idx = occupation_table_index.get(link_occupation)
                             if not occupation_itm is None:
                                 link_profession = occupation_itm[COL_OCCUPATION_TABLE_PROFESSION]
                                 link_sector = occupation_itm[COL_OCCUPATION_TABLE_SECTOR]
@@ -786,7 +3306,8 @@ class MLFeatureOccupationCorrespondence(MLFeature):
                             #                                                             correspondence, occupation_correspondence))
 
         else:
-            occupation_correspondence = get_valuedatelist_correspondence(mainperson_occupation, linkperson_occupation)
+            occupation_correspondence = get_valuedatelist_correspondence(mainperson_occupation, linkperson_occupation,
+                                                                         kwargs_features.get('valuesets'))
         
         return (occupation_correspondence, result)
 
@@ -811,10 +3332,36 @@ class MLFeatureResidenceCorrespondence(MLFeature):
         mainperson_residence = mainperson[COL_PERSON_RESIDENCE]
         linkperson_residence = linkperson[COL_PERSON_RESIDENCE]
 
-        residence_correspondence = get_valuedatelist_correspondence(mainperson_residence, linkperson_residence)
+        residence_correspondence = get_valuedatelist_correspondence(mainperson_residence, linkperson_residence,
+                                                                    kwargs_features.get('valuesets'))
         
         return (residence_correspondence, result)
 
+    def get_values(self, main_idx_array: np.ndarray,
+                   link_idx_array: np.ndarray,
+                   linktype_codes: np.ndarray) -> (np.ndarray, np.ndarray):
+        """ A float column, the correspondence is determined once per distinct
+            pair of residences
+        """
+        person_table = self.feature_batch.person_table
+        residence_values = person_table.residence_values
+        valuesets = self.feature_batch.kwargs_features.get('valuesets')
+        n_residence = len(residence_values)
+        main_residence_ids = person_table.residence_ids[np.asarray(main_idx_array, dtype=np.int64)].astype(np.int64)
+        link_residence_ids = person_table.residence_ids[np.asarray(link_idx_array, dtype=np.int64)].astype(np.int64)
+        # without residence (-1) the correspondence is 0.0
+        both = (main_residence_ids >= 0) & (link_residence_ids >= 0)
+        distinct_pairs, inverse = np.unique(main_residence_ids[both] * n_residence + link_residence_ids[both],
+                                            return_inverse=True)
+        distinct_correspondences = np.array(
+            [get_valuedatelist_correspondence(residence_values[pair // n_residence],
+                                              residence_values[pair % n_residence],
+                                              valuesets)
+             for pair in distinct_pairs.tolist()], dtype=np.float64)
+        values = np.zeros(len(main_residence_ids), dtype=np.float64)
+        values[both] = distinct_correspondences[inverse]
+        return (values, np.ones(len(values), dtype=bool))
+
 
 class MLFeatureSurnameSimilarity(MLFeature):
     def __init__(self):
@@ -837,9 +3384,21 @@ class MLFeatureSurnameSimilarity(MLFeature):
             name_similarity_mode: ('LevenshteinDistance', threshold)
             name_similarity_mode: ('LevenshteinDistanceBool', threshold)
             name_similarity_mode: ('LevenshteinDistanceRelative', threshold)
+
+            kwargs_features['surname_bktree']: BKTree (optional)
+                With 'LevenshteinDistanceBool' the names within the threshold
+                are searched in this BKTree of the surnames.
+            kwargs_features['surname_distance_cache']: SurnameDistanceCache (optional)
+                The distances are looked up in this cache.
         """
         surname_similarity = 0.0
         result = True
+
+        surname_distance_cache = kwargs_features.get('surname_distance_cache')
+        if surname_distance_cache is not None:
+            get_distance = surname_distance_cache.get_distance
+        else:
+            get_distance = Levenshtein._levenshtein.distance
         
         mainperson_name_list = mainperson[COL_PERSON_NAME_LIST]
         linkperson_name_list = linkperson[COL_PERSON_NAME_LIST]
@@ -853,7 +3412,7 @@ class MLFeatureSurnameSimilarity(MLFeature):
             min_distance = threshold + 1
             for mainfullsurname in mainperson_name_list:
                 for linkfullsurname in linkperson_name_list:
-                    distance = Levenshtein._levenshtein.distance(mainfullsurname, linkfullsurname)
+                    distance = get_distance(mainfullsurname, linkfullsurname)
                     if distance < min_distance:
                         min_distance = distance
             if min_distance <= threshold:
@@ -861,11 +3420,19 @@ class MLFeatureSurnameSimilarity(MLFeature):
                     surname_similarity = round(1 - (min_distance / threshold), 2)
                 else:
                     surname_similarity = 1.0
+        elif (similarity_method == 'LevenshteinDistanceBool') and \
+             (kwargs_features.get('surname_bktree') is not None):
+            # only whether any pair of names is within the threshold matters
+            surname_bktree = kwargs_features['surname_bktree']
+            for mainfullsurname in mainperson_name_list:
+                if surname_bktree.has_name_within(mainfullsurname, linkperson_name_list, threshold):
+                    surname_similarity = 1.0
+                    break
         elif similarity_method == 'LevenshteinDistanceBool':
             min_distance = threshold + 1
             for mainfullsurname in mainperson_name_list:
                 for linkfullsurname in linkperson_name_list:
-                    distance = Levenshtein._levenshtein.distance(mainfullsurname, linkfullsurname)
+                    distance = get_distance(mainfullsurname, linkfullsurname)
                     if distance < min_distance:
                         min_distance = distance
             if min_distance <= threshold:
@@ -892,7 +3459,7 @@ class MLFeatureSurnameSimilarity(MLFeature):
                 rel_threshold = len(mainfullsurname)
                 min_distance = rel_threshold + 1
                 for linkfullsurname in linkperson_name_list:
-                    distance = Levenshtein._levenshtein.distance(mainfullsurname, linkfullsurname)
+                    distance = get_distance(mainfullsurname, linkfullsurname)
                     if distance < min_distance:
                         min_distance = distance
                 if min_distance <= rel_threshold:
@@ -909,6 +3476,356 @@ class MLFeatureSurnameSimilarity(MLFeature):
         return (surname_similarity, result)
 
 
+###################################################################
+#
+# Snapshot Cache
+#
+###################################################################
+
+def get_file_content_hash(filename: str) -> str:
+    file_hash = hashlib.blake2b(digest_size=20)
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+def write_file_atomic(dirname: str, filename: str, data: bytes):
+    """ Write to a temporary file in dirname and rename it, so the file is
+        never read half written (also not after a crash)
+    """
+    fd, tmp_filename = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filename, os.path.join(dirname, filename))
+    except BaseException:
+        os.remove(tmp_filename)
+        raise
+
+def get_snapshot_version() -> int:
+    """ The version of a snapshot: a hash of _SNAPSHOT_CACHE_VERSION and the
+        fields of GrampsTables and its records, so a snapshot with another
+        layout of the tables is never loaded
+    """
+    tables = GrampsTables("")
+    schema = (_SNAPSHOT_CACHE_VERSION,
+              sorted(vars(tables)),
+              sorted(vars(tables.tags)),
+              BirthEvent._fields,
+              Family._fields,
+              Relative._fields,
+              Person._fields,
+              sorted((name, value) for name, value in globals().items()
+                     if name.startswith('_COL_PERSONRECORD_')))
+    return int.from_bytes(hashlib.blake2b(repr(schema).encode(), digest_size=4).digest(), 'little')
+
+class SnapshotCache:
+    """ On-disk cache of the tables (GrampsTables) extracted from Gramps XML
+        files, so an unchanged file doesn't have to be parsed again.
+
+        A snapshot is stored under the content hash of the XML file. An index
+        maps the path, size and mtime of a file to its content hash, so for an
+        unchanged file only the snapshot itself is read. A file that is only
+        touched (or copied) is hashed again and still finds its snapshot.
+
+        A snapshot starts with a header (magic, version, length of the JSON
+        description) followed by the pickled tables. Snapshots with another
+        version (see get_snapshot_version) or which can't be unpickled anymore
+        (for instance because a class was renamed) are deleted when found. When the
+        snapshots together exceed max_size bytes the least recently used ones
+        are deleted.
+    """
+    _INDEX_FILENAME = "index.json"
+    _SNAPSHOT_EXT = ".snapshot"
+
+    def __init__(self, cache_dir: str, max_size: int = 1 << 30):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _get_stat_key(self, xml_filename: str) -> str:
+        stat = os.stat(xml_filename)
+        return "{}|{}|{}".format(os.path.abspath(xml_filename), stat.st_size, stat.st_mtime_ns)
+
+    def _get_snapshot_filename(self, content_hash: str) -> str:
+        return os.path.join(self.cache_dir, content_hash + self._SNAPSHOT_EXT)
+
+    def _read_index(self) -> dict:
+        try:
+            with open(os.path.join(self.cache_dir, self._INDEX_FILENAME)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_index(self, index: dict):
+        self._write_atomic(self._INDEX_FILENAME, json.dumps(index).encode())
+
+    def _write_atomic(self, filename: str, data: bytes):
+        # a snapshot or index is never read half written
+        write_file_atomic(self.cache_dir, filename, data)
+
+    def _get_content_hash(self, xml_filename: str, index: dict) -> (str, str):
+        stat_key = self._get_stat_key(xml_filename)
+        content_hash = index.get(stat_key)
+        if content_hash is None:
+            content_hash = get_file_content_hash(xml_filename)
+        return (stat_key, content_hash)
+
+    def load(self, xml_filename: str) -> GrampsTables:
+        """ The cached tables of the xml file, or None if not (or no longer)
+            in the cache
+        """
+        index = self._read_index()
+        stat_key, content_hash = self._get_content_hash(xml_filename, index)
+        snapshot_filename = self._get_snapshot_filename(content_hash)
+        try:
+            with open(snapshot_filename, 'rb') as f:
+                header = f.read(struct.calcsize(_SNAPSHOT_HEADER_FORMAT))
+                magic, version, description_size = struct.unpack(_SNAPSHOT_HEADER_FORMAT, header)
+                if (magic != _SNAPSHOT_MAGIC) or (version != get_snapshot_version()):
+                    tables = None
+                else:
+                    f.seek(description_size, os.SEEK_CUR)
+                    tables = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # not readable (anymore), for instance a class of the snapshot
+            # can't be found (ModuleNotFoundError, AttributeError)
+            tables = None
+        if not isinstance(tables, GrampsTables):
+            tables = None
+        if tables is None:
+            # stale or damaged snapshot
+            self._remove_snapshot(content_hash)
+            return None
+        # mark as recently used
+        os.utime(snapshot_filename)
+        if index.get(stat_key) != content_hash:
+            index[stat_key] = content_hash
+            self._write_index(index)
+        return tables
+
+    def save(self, xml_filename: str, tables: GrampsTables):
+        index = self._read_index()
+        stat_key, content_hash = self._get_content_hash(xml_filename, index)
+        description = json.dumps({'xml_filename': os.path.abspath(xml_filename),
+                                  'stat_key': stat_key,
+                                  'content_hash': content_hash,
+                                  'created': datetime.now().isoformat()}).encode()
+        data = struct.pack(_SNAPSHOT_HEADER_FORMAT, _SNAPSHOT_MAGIC,
+                           get_snapshot_version(), len(description)) + \
+               description + pickle.dumps(tables, protocol=pickle.HIGHEST_PROTOCOL)
+        self._write_atomic(content_hash + self._SNAPSHOT_EXT, data)
+        index[stat_key] = content_hash
+        self._write_index(index)
+        self._limit_size()
+
+    def _remove_snapshot(self, content_hash: str):
+        try:
+            os.remove(self._get_snapshot_filename(content_hash))
+        except FileNotFoundError:
+            pass
+        index = self._read_index()
+        stale_keys = [key for key, value in index.items() if value == content_hash]
+        if stale_keys:
+            for key in stale_keys:
+                del index[key]
+            self._write_index(index)
+
+    def _limit_size(self):
+        snapshot_list = []
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith(self._SNAPSHOT_EXT):
+                stat = os.stat(os.path.join(self.cache_dir, filename))
+                snapshot_list.append((stat.st_mtime_ns, stat.st_size,
+                                      filename[:-len(self._SNAPSHOT_EXT)]))
+        total_size = sum(snapshot[1] for snapshot in snapshot_list)
+        # delete the least recently used snapshots first
+        snapshot_list.sort()
+        for mtime, size, content_hash in snapshot_list:
+            if total_size <= self.max_size:
+                break
+            self._remove_snapshot(content_hash)
+            total_size -= size
+
+    def invalidate(self, xml_filename: str = None):
+        """ Delete the snapshot of the xml file, or all snapshots if
+            xml_filename is None
+        """
+        if xml_filename is None:
+            for filename in os.listdir(self.cache_dir):
+                if filename.endswith(self._SNAPSHOT_EXT) or (filename == self._INDEX_FILENAME):
+                    os.remove(os.path.join(self.cache_dir, filename))
+            return
+        index = self._read_index()
+        path = os.path.abspath(xml_filename)
+        content_hash_list = [content_hash for key, content_hash in index.items()
+                             if key.rsplit("|", 2)[0] == path]
+        if os.path.isfile(xml_filename):
+            content_hash_list.append(self._get_content_hash(xml_filename, index)[1])
+        for content_hash in set(content_hash_list):
+            self._remove_snapshot(content_hash)
+
+
+###################################################################
+#
+# Personlink Checkpoints
+#
+###################################################################
+
+def update_content_hash(content_hash, value):
+    """ Add a canonical encoding of value to content_hash (a hashlib object),
+        value by value so nothing is serialized as a whole. The items of sets
+        and dicts are added in the order of their own hashes, so the result
+        doesn't depend on the order of a set (PYTHONHASHSEED). Lists and tuples
+        (also NamedTuples) are encoded the same way. Other objects are encoded
+        by their class name and state (__getstate__ or __dict__).
+    """
+    if value is None:
+        content_hash.update(b'N')
+    elif isinstance(value, (bool, np.bool_)):
+        content_hash.update(b'B1' if value else b'B0')
+    elif isinstance(value, (int, np.integer)):
+        content_hash.update(b'I%d;' % int(value))
+    elif isinstance(value, (float, np.floating)):
+        content_hash.update(b'F' + repr(float(value)).encode() + b';')
+    elif isinstance(value, str):
+        data = value.encode('utf-8', 'surrogatepass')
+        content_hash.update(b'S%d:' % len(data) + data)
+    elif isinstance(value, (bytes, bytearray)):
+        content_hash.update(b'Y%d:' % len(value) + bytes(value))
+    elif isinstance(value, np.ndarray):
+        content_hash.update("A{}{}:".format(value.dtype.str, value.shape).encode())
+        if value.dtype.hasobject:
+            for item in value.ravel().tolist():
+                update_content_hash(content_hash, item)
+        else:
+            content_hash.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        content_hash.update(b'L%d:' % len(value))
+        for item in value:
+            update_content_hash(content_hash, item)
+    elif isinstance(value, (set, frozenset)):
+        content_hash.update(b'E%d:' % len(value))
+        for item_hash in sorted(get_content_hash(item) for item in value):
+            content_hash.update(item_hash)
+    elif isinstance(value, dict):
+        content_hash.update(b'D%d:' % len(value))
+        for item_hash in sorted(get_content_hash(item) for item in value.items()):
+            content_hash.update(item_hash)
+    else:
+        content_hash.update("O{}.{}:".format(type(value).__module__, type(value).__qualname__).encode())
+        state = value.__getstate__() if hasattr(value, '__getstate__') else getattr(value, '__dict__', None)
+        if state is None:
+            content_hash.update(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        else:
+            update_content_hash(content_hash, state)
+
+def get_content_hash(value) -> bytes:
+    # the digest of update_content_hash
+    content_hash = hashlib.blake2b(digest_size=20)
+    update_content_hash(content_hash, value)
+    return content_hash.digest()
+
+def get_personlink_run_key(*args) -> str:
+    """ Hash of the input and parameters of a personlink run (see
+        update_content_hash), a checkpoint can only be resumed by a run with
+        the same key
+    """
+    run_hash = hashlib.blake2b(digest_size=20)
+    for arg in args:
+        update_content_hash(run_hash, arg)
+    return run_hash.hexdigest()
+
+class PersonlinkCheckpoint:
+    """ Directory with the personlinks of a run in shards, a shard has the
+        personlinks of a range [mp_start, mp_end) of mainpersons (see
+        MLGrampsConnect.get_personlink_list_checkpointed).
+
+        manifest.json holds the version, the key of the run (see
+        get_personlink_run_key) and per finished shard its file, number of
+        personlinks and content hash. A shard and then the manifest are
+        written atomically, so after a crash a shard is either finished and
+        in the manifest or it is created again. A shard of which the content
+        doesn't match its hash is also created again. The directory of
+        another run (or version) is not used.
+    """
+    _MANIFEST_FILENAME = "manifest.json"
+
+    def __init__(self, checkpoint_dir: str, run_key: str):
+        self.checkpoint_dir = checkpoint_dir
+        self.run_key = run_key
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        manifest = self._read_manifest()
+        if manifest is None:
+            manifest = {'version': _PERSONLINK_CHECKPOINT_VERSION,
+                        'run_key': run_key,
+                        'shards': {}}
+        elif (manifest.get('version') != _PERSONLINK_CHECKPOINT_VERSION) or \
+             (manifest.get('run_key') != run_key):
+            raise ValueError("Checkpoint directory {} holds another personlink run".format(
+                checkpoint_dir))
+        self.manifest = manifest
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(os.path.join(self.checkpoint_dir, self._MANIFEST_FILENAME)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_manifest(self):
+        write_file_atomic(self.checkpoint_dir, self._MANIFEST_FILENAME,
+                          json.dumps(self.manifest, indent=1).encode())
+
+    @staticmethod
+    def _get_shard_key(mp_start: int, mp_end: int) -> str:
+        return "{}-{}".format(mp_start, mp_end)
+
+    def get_shard_filename(self, mp_start: int, mp_end: int) -> str:
+        return "personlinks_{:09d}_{:09d}.pickle".format(mp_start, mp_end)
+
+    def has_shard(self, mp_start: int, mp_end: int) -> bool:
+        shard = self.manifest['shards'].get(self._get_shard_key(mp_start, mp_end))
+        if shard is None:
+            return False
+        try:
+            return os.path.getsize(os.path.join(self.checkpoint_dir, shard['file'])) == shard['size']
+        except OSError:
+            return False
+
+    def save_shard(self, mp_start: int, mp_end: int, personlink_list: list):
+        data = pickle.dumps(personlink_list, protocol=pickle.HIGHEST_PROTOCOL)
+        filename = self.get_shard_filename(mp_start, mp_end)
+        write_file_atomic(self.checkpoint_dir, filename, data)
+        self.manifest['shards'][self._get_shard_key(mp_start, mp_end)] = {
+            'file': filename,
+            'mp_start': mp_start,
+            'mp_end': mp_end,
+            'n_personlink': len(personlink_list),
+            'size': len(data),
+            'hash': hashlib.blake2b(data, digest_size=20).hexdigest()}
+        self._write_manifest()
+
+    def load_shard(self, mp_start: int, mp_end: int) -> list:
+        """ The personlinks of the shard, or None if it's not (correctly) saved
+        """
+        shard = self.manifest['shards'].get(self._get_shard_key(mp_start, mp_end))
+        if shard is None:
+            return None
+        try:
+            with open(os.path.join(self.checkpoint_dir, shard['file']), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if hashlib.blake2b(data, digest_size=20).hexdigest() != shard['hash']:
+            return None
+        return pickle.loads(data)
+
+
 ###################################################################
 #
 # MLGrampsConnect Class
@@ -921,9 +3838,91 @@ class MLGrampsConnect:
         self.familytree = None
         self.familytree_root = None
         self.xmlns = None
+        self.streaming = False
         self._combined_list = []
+        # birth events, families and person records extracted (once) from
+        # the family tree
+        self._tables = None
+        # the (number of siblings, number of children) per person handle,
+        # counted by get_person_list (see add_relative_counts)
+        self._relative_counts = {}
+        # the pool of processes for the calls with n_proc (see session)
+        self.worker_session = None
+
+    def session(self, n_proc: int = -1, reference_tables: tuple = ()) -> WorkerSession:
+        """ Open a WorkerSession: until it's closed the calls with more than one
+            process (n_proc) use its pool of n_proc processes, which keeps the
+            reference tables (for instance the person_list and the tables of
+            kwargs_features) loaded. The reference_tables are loaded in advance.
+
+            with mlgc.session(n_proc=-1, reference_tables=(person_list,)):
+                connection_list, ... = mlgc.get_connection_list(person_list, ..., n_proc=-1)
+                personlink_list, ... = mlgc.get_personlink_list(person_list, ..., n_proc=-1)
+
+            Only one session can be open at a time.
+        """
+        if self._get_worker_session() is not None:
+            raise ValueError("a session is already open")
+        self.worker_session = WorkerSession(n_proc, reference_tables)
+        return self.worker_session
+
+    def _get_worker_session(self) -> WorkerSession:
+        # the open session or None
+        if (self.worker_session is not None) and (self.worker_session.pool is not None):
+            return self.worker_session
+        return None
 
-    def load(self, xml_filename):
+    def _open_state_pool(self, n_pool: int, state, reference_tables: tuple = ()):
+        """ The state in the pool of the open session, otherwise in a new
+            StatePool of n_pool processes
+        """
+        worker_session = self._get_worker_session()
+        if worker_session is not None:
+            return worker_session.open_state(state, reference_tables)
+        return StatePool(n_pool, state)
+
+    def load(self, xml_filename, streaming: bool = False,
+             snapshot_cache: SnapshotCache = None):
+        """ xml_filename: Gramps XML backup (uncompressed)
+            streaming: bool (default: False)
+                If False the whole XML DOM is kept in self.familytree. If True
+                the file is read with lxml.etree.iterparse and only the birth
+                events, families and persons are kept in compact tables. Each
+                element is cleared as soon as it has been read, so the peak
+                memory depends on the size of these tables and not on the
+                size of the XML file.
+            snapshot_cache: SnapshotCache (default: None)
+                If the tables of this (unchanged) file are in the cache they are
+                loaded from it and the file isn't parsed at all (self.familytree is
+                None then). Otherwise the file is loaded and its tables are added
+                to the cache.
+        """
+        # the relatives may differ in another (version of the) family tree
+        self._relative_counts = {}
+        if snapshot_cache is not None:
+            tables = snapshot_cache.load(xml_filename)
+            if tables is not None:
+                self.filename = xml_filename
+                self.familytree = None
+                self.familytree_root = None
+                self.xmlns = tables.tags.xmlns
+                self.streaming = False
+                self._tables = tables
+                return
+            self.load(xml_filename, streaming=streaming)
+            if self.filename == xml_filename:
+                snapshot_cache.save(xml_filename, self._get_tables())
+            return
+        if streaming:
+            tables = GrampsTables.from_iterparse(xml_filename)
+            if tables:
+                self.filename = xml_filename
+                self.familytree = None
+                self.familytree_root = None
+                self.xmlns = tables.tags.xmlns
+                self.streaming = True
+                self._tables = tables
+            return
         # load tree
         familytree = lxml.etree.parse(xml_filename)
         if familytree:
@@ -936,49 +3935,25 @@ class MLGrampsConnect:
             m = re.search('{.*}', self.familytree_root.tag)
             if m:
                 self.xmlns = m.group(0)
+            self.streaming = False
+            # the tables are extracted from the tree at first use
+            self._tables = None
+
+    def _get_tables(self) -> GrampsTables:
+        # All tables are extracted in a single pass over the family tree
+        # and only once after loading it
+        if self._tables is None:
+            self._tables = GrampsTables.from_root(self.familytree_root, self.xmlns)
+        return self._tables
 
     def _get_birth_event_list(self):
-        birth_event_list = []
-        for birth_event_elem in self.familytree_root.findall(self.xmlns+"events"+"/"+self.xmlns+"event"):
-            # get event handle
-            event_handle = birth_event_elem.get('handle')
-            # get type of event
-            event_type = None
-            event_type_elem_list = birth_event_elem.findall(self.xmlns+"type")
-            if event_type_elem_list:
-                event_type = event_type_elem_list[0].text
-            if event_type == 'Birth':
-                # get dateval
-                dateval_elem_list = birth_event_elem.findall(self.xmlns+"dateval")
-                if dateval_elem_list:
-                    dateval_val = dateval_elem_list[0].get('val')
-                    dateval_type = dateval_elem_list[0].get('type')
-                    birth_event_list.append([event_handle, dateval_val, dateval_type])
-        return birth_event_list
+        return list(self._get_tables().birth_event_list)
 
     def get_family_list(self):
-        family_list = []
-        for family_elem in self.familytree_root.findall(self.xmlns+"families"+"/"+self.xmlns+"family"):
-            # get family handle
-            family_handle = family_elem.get('handle')
-            # get father
-            father = None
-            father_elem_list = family_elem.findall(self.xmlns+"father")
-            if father_elem_list:
-                father = father_elem_list[0].get("hlink")
-            # get mother
-            mother = None
-            mother_elem_list = family_elem.findall(self.xmlns+"mother")
-            if mother_elem_list:
-                mother = mother_elem_list[0].get("hlink")
-            # get children
-            childrefs_tuple = tuple()
-            childref_elem_list = family_elem.findall(self.xmlns+"childref")
-            for childref_elem in childref_elem_list:
-                childref = childref_elem.get("hlink")
-                childrefs_tuple = childrefs_tuple + (childref,)
-            family_list.append((family_handle, father, mother, childrefs_tuple))
-        return family_list
+        return list(self._get_tables().family_list)
+
+    def _get_person_record_list(self):
+        return self._get_tables().person_record_list
 
     def get_mlfeature_list(self, features):
         mlfeature_list = []
@@ -1005,6 +3980,15 @@ class MLGrampsConnect:
                 mlfeature_list.append(mlfeature)
         return mlfeature_list
 
+    def get_personlink_fieldnames(self, features) -> tuple:
+        """ The fieldnames of the personlinks with the features (see
+            get_personlink_list and iter_personlinks)
+        """
+        fieldnames = MAIN_LINK_PERSON_FIELDNAMES + (TARGET_FIELDNAME,)
+        for mlfeature in self.get_mlfeature_list(features):
+            fieldnames = fieldnames + (mlfeature.get_title(),)
+        return fieldnames
+
     def get_occupation_list(self, occupation_replacement_table: list,
                                   stopword_words_list,
                                   place_words_list,
@@ -1031,14 +4015,14 @@ class MLGrampsConnect:
         # occupation_exclude_table, occupation_exclude_headings = import_list_from_csv(occupation_exclude_table_csv, has_heading=True)
         # occupation_exclude_words_list = [occupation_exclude[0].lower() for occupation_exclude in occupation_exclude_table]
 
+        # compile the replacements once (same result as replace_words)
+        text_normalizer = TextNormalizer(occupation_replacement_table)
+
         occupation_list = []
         # get attributes Occupation
-        for attribute_elem in self.familytree_root.findall(self.xmlns+"people"+"/"+self.xmlns+"person"+"/"+self.xmlns+"attribute"):
-            attribute_type = attribute_elem.get('type')
-            attribute_value = attribute_elem.get('value')
-            if attribute_type == 'Beroep':
-                occupation = attribute_value
-                occupation = replace_words(occupation_replacement_table, occupation)
+        for person_record in self._get_person_record_list():
+            for occupation in person_record[_COL_PERSONRECORD_OCCUPATION_LIST]:
+                occupation = text_normalizer.replace_words(occupation)
                 # split occupation string in words
                 for occupation_word in occupation.split():
                     occupation_list.append(occupation_word.lower())
@@ -1046,7 +4030,8 @@ class MLGrampsConnect:
         # Filter duplicates and words from (in this order) stop_words_list,
         # place_words_list and occupation_exclude_words_list    
         occupation_list = filter_duplicates_and_special_words(
-            (stopword_words_list, place_words_list, occupation_exclude_words_list),
+            (frozenset(stopword_words_list), frozenset(place_words_list),
+             frozenset(occupation_exclude_words_list)),
             occupation_list)
 
         # sort if necessary
@@ -1067,81 +4052,23 @@ class MLGrampsConnect:
                               "Gender", "Birth Date", "Occupation",
                               "Residence", "Relatives List")
 
-        def get_key_birth_date_sort_value(person_tuple):
-            birth_date = person_tuple[COL_PERSON_BIRTH_DATE]
-            if birth_date:
-                birth_date_str = birth_date[0]
-            else:
-                # if birth_date is None set the birth_date_str to an empty string
-                # otherwise the person_list cannot be sorted while comparing None with a string
-                birth_date_str = '' 
-            # return get_date_sort_value(birth_date_str)
-            birth_date_sort_value = get_date_sort_value(birth_date_str)
-            return birth_date_sort_value
-
-        # TODO Decide whether get birth_event_list and/or family_list
-        # could be done once. For instance in load function instead of
-        # every time a person_list has to be delivered
-
-        # get birth_event_list
-        birth_event_list = self._get_birth_event_list()
-        # get family_list
-        family_list = self.get_family_list()
+        # birth_event_list, family_list and the person records are extracted
+        # once (in a single pass) after loading the family tree
+
+        # get the handle indexes of birth_event_list and family_list
+        tables = self._get_tables()
+        birth_event_index = tables.get_birth_event_index()
+        family_index = tables.get_family_index()
 
         person_list = []
-        for person_elem in self.familytree_root.findall(self.xmlns+"people"+"/"+self.xmlns+"person"):
-            # get handle
-            handle = person_elem.get('handle')
-            # get id
-            id = person_elem.get('id')
-            # get gender
-            gender = None
-            gender_elem_list = person_elem.findall(self.xmlns+"gender")
-            if gender_elem_list:
-                gender = gender_elem_list[0].text
-            # get name_list
-            name_dict = tuple()
-            name_elem_list = person_elem.findall(self.xmlns+"name")
-            for name_elem in name_elem_list:
-                name = None
-                # get prefix(es) and surname(s)
-                prefix = None
-                surname = None
-                surname_elem_list = name_elem.findall(self.xmlns+"surname")
-                for surname_elem in surname_elem_list:
-                    # prefix = surname_elem_list[0].get('prefix')
-                    # surname = surname_elem_list[0].text
-                    prefix = surname_elem.get('prefix')
-                    surname = surname_elem.text
-                    # set name (= first + [prefix + surname])
-                    if prefix:
-                        if name:
-                            name = name + " " + prefix
-                        else:
-                            name = prefix
-                    if surname:
-                        if name:
-                            name = name + " " + surname
-                        else:
-                            name = surname
-                if name:
-                    name_dict = name_dict + (name,)
-
-            # get attributes Occupation and Residence
-            occupation = None
-            residence = None
-            attribute_elem_list = person_elem.findall(self.xmlns+"attribute")
-            for attribute_elem in attribute_elem_list:
-                # attributes of any type, so also the Occupation and Residence
-                # types, could technically occur more than once. But these
-                # are, in principle, imput only once. If not (arbitrarely)
-                # took the last. 
-                attribute_type = attribute_elem.get('type')
-                attribute_value = attribute_elem.get('value')
-                if attribute_type == 'Beroep':
-                    occupation = attribute_value
-                elif attribute_type == 'Woonplaats':
-                    residence = attribute_value
+        for person_record in self._get_person_record_list():
+            handle = person_record[_COL_PERSONRECORD_HANDLE]
+            id = person_record[_COL_PERSONRECORD_ID]
+            # intern the names, the same surnames are shared by many persons
+            name_dict = tuple(map(sys.intern, person_record[_COL_PERSONRECORD_NAME_LIST]))
+            gender = person_record[_COL_PERSONRECORD_GENDER]
+            occupation = person_record[_COL_PERSONRECORD_OCCUPATION]
+            residence = person_record[_COL_PERSONRECORD_RESIDENCE]
 
             # Depending on the parameters include_empty_occupation and include_empty_residence 
             # and the occupation/residence value in- or exclude this person
@@ -1150,10 +4077,10 @@ class MLGrampsConnect:
                 # get birth_date
                 birth_date = None
                 # get eventref_list
-                eventref_list = get_handle_list(person_elem, self.xmlns, "eventref", "hlink")
+                eventref_list = person_record[_COL_PERSONRECORD_EVENTREF_LIST]
                 birth_event = None
                 for eventref in eventref_list:
-                    birth_event, idx = get_listitem_from_list_by_handle(birth_event_list, eventref, COL_EVENT_HANDLE)
+                    birth_event, idx = birth_event_index.get(eventref)
                     if birth_event:
                         break
                 if birth_event:
@@ -1162,13 +4089,13 @@ class MLGrampsConnect:
                 # Depending on the parameter include_none_dates and the birth_date in- or exclude this person
                 if include_none_dates or (not include_none_dates and birth_date):
                     # init relatives which will be filled from the persons childof_list and parentin_list
-                    relatives = tuple()
+                    relatives = []
 
                     # get childof_list
-                    childof_family_list = get_handle_list(person_elem, self.xmlns, "childof", "hlink")
+                    childof_family_list = person_record[_COL_PERSONRECORD_CHILDOF_LIST]
                     # get parent en brother/siter relative
                     for childof_family in childof_family_list:
-                        family, idx = get_listitem_from_list_by_handle(family_list, childof_family, COL_FAMILY_HANDLE)
+                        family, idx = family_index.get(childof_family)
                         # Gramps is responsible for keeping the consistency of the
                         # database, so if there is a reference also a fanliy record
                         # SHOULD be found. But as a technical precaution we check
@@ -1180,20 +4107,20 @@ class MLGrampsConnect:
 
                             if father:
                                 # relatives.append([father, 'Ouder'])
-                                relatives = relatives + ((childof_family, father, 'Vader'),)
+                                relatives.append(Relative(childof_family, father, 'Vader'))
                             if mother:
                                 # relatives.append([mother, 'Ouder'])
-                                relatives = relatives + ((childof_family, mother, 'Moeder'),)
+                                relatives.append(Relative(childof_family, mother, 'Moeder'))
                             for childref in childref_list:
                                 # check whether the child is EQ to the person itself
                                 if childref != handle:
-                                    relatives = relatives + ((childof_family, childref, 'Broer/zus'),)
+                                    relatives.append(Relative(childof_family, childref, 'Broer/zus'))
 
                     # get parentin_list
-                    parentin_family_list = get_handle_list(person_elem, self.xmlns, "parentin", "hlink")
+                    parentin_family_list = person_record[_COL_PERSONRECORD_PARENTIN_LIST]
                     # get spouse and child relative
                     for parentin_family in parentin_family_list:
-                        family, idx = get_listitem_from_list_by_handle(family_list, parentin_family, COL_FAMILY_HANDLE)
+                        family, idx = family_index.get(parentin_family)
                         # Gramps is resopnisble for keeping the consistency of the
                         # database, so if there is a reference also a fanliy record
                         # SHOULD be found. But as a technical precaution we check
@@ -1217,16 +4144,23 @@ class MLGrampsConnect:
                                     # linktype_spouse = 'Echtgeno(o)t(e)'
                                     linktype_spouse = 'Man'
                             if spouse:
-                                relatives = relatives + ((parentin_family, spouse, linktype_spouse),)
+                                relatives.append(Relative(parentin_family, spouse, linktype_spouse))
                             for childref in childref_list:
-                                relatives = relatives + ((parentin_family, childref, 'Kind'),)
+                                relatives.append(Relative(parentin_family, childref, 'Kind'))
 
                     # add person data to the person_list
-                    person_list.append((handle, id, name_dict, gender, birth_date, residence, occupation, relatives))
+                    relatives = tuple(relatives)
+                    person_list.append(Person(handle, id, name_dict, gender, birth_date, residence, occupation, relatives))
+                    # count the siblings and children once
+                    self._relative_counts[handle] = get_relative_counts(relatives)
 
         # sort person_list
         if sort_by_birthdate:
-            person_list.sort(key=get_key_birth_date_sort_value)
+            # if birth_date is None the sort value of an empty string is used (0)
+            sort_values = get_date_sort_values([person[COL_PERSON_BIRTH_DATE][0]
+                                                if person[COL_PERSON_BIRTH_DATE] else ''
+                                                for person in person_list])
+            person_list = [person_list[i] for i in np.argsort(sort_values, kind='stable').tolist()]
             
         return (person_list, _PERSON_FIELDNAMES)
 
@@ -1238,6 +4172,10 @@ class MLGrampsConnect:
                                   randomseed: int = None,
                                   include_none_dates: bool = False,
                                   max_abs_age_delta: int = ABS_AGE_DELTA_ONE_GENERATION,
+                                  person_index: PersonIndex = None,
+                                  return_connection_graph: bool = False,
+                                  n_proc: int = 1,
+                                  mainperson_chunksize: int = None,
                                   **kwargs_features) -> (list, list, list):
         """ person_list: input data
             features: tuple of features examined in the input and added as columns in the output
@@ -1248,6 +4186,19 @@ class MLGrampsConnect:
                 Include connection for which the birth_date of one or both persons
                 is None. In include such connection the Age Delta cound not be calculated.
             max_abs_age_delta: int (default: ABS_AGE_DELTA_ONE_GENERATION)
+            person_index: PersonIndex (default: None)
+                Index of the person_list (handle -> position). If None it is built
+                from the person_list. Pass it to reuse one index for several calls.
+            return_connection_graph: bool (default: False)
+                If True the connections are also returned as a ConnectionGraph
+                (CSR adjacency structure) as fourth element of the result.
+            n_proc: int (default: 1)
+                The number of processes, < 0: all processors. With more than one
+                process the mainpersons are divided into contiguous chunks of
+                mainperson_chunksize (default: a quarter of the mainpersons per
+                process), the result is the same as with one process. The random
+                connections are drawn in advance (draw_random_connection_handles),
+                so the random stream is also the same.
             **kwargs_features
         """
 
@@ -1259,6 +4210,20 @@ class MLGrampsConnect:
         for mlfeature in mlfeature_list:
             fieldnames = fieldnames + (mlfeature.get_title(),)
 
+        # set the handle indexes of the person_list and occupation_table
+        if person_index is None:
+            person_index = PersonIndex(person_list)
+        kwargs_features = add_occupation_table_index(kwargs_features)
+        # cache the distances between the surnames
+        kwargs_features = add_surname_distance_cache(kwargs_features, person_list, mlfeature_list)
+        # normalize the occupations once
+        kwargs_features = add_occupation_codebook(kwargs_features, person_list, mlfeature_list)
+        # count the siblings and children once
+        kwargs_features = add_relative_counts(kwargs_features, person_list, mlfeature_list,
+                                              self._relative_counts)
+        # parse the residences and occupations once
+        kwargs_features = add_valuesets(kwargs_features, person_list, mlfeature_list)
+
         # check wether random connections has to be added
         if type(n_random_conn_pp) == int:
             random_connections_per_person = n_random_conn_pp
@@ -1266,119 +4231,206 @@ class MLGrampsConnect:
             random_connections_per_person = 0
         add_random_connections = random_connections_per_person > 0
         # if random connections has to be added, check whether random.seed has to be set
+        random_handle_list = None
         if add_random_connections:
             random.seed(a=randomseed)
-
-        # init loop
+            # draw them all in advance, so the random stream doesn't depend
+            # on the order in which the mainpersons are processed
+            random_handle_list = draw_random_connection_handles(person_list, random_connections_per_person)
+
+        state = ConnectionWorkerState(mlfeature_list,
+                                      linktype_mode,
+                                      name_similarity_mode,
+                                      include_none_dates,
+                                      max_abs_age_delta,
+                                      person_list,
+                                      person_index,
+                                      kwargs_features)
         n_person = len(person_list)
+
+        use_multiprocesses = (n_proc < 0) or (n_proc > 1)
+        if use_multiprocesses and (n_person > 0):
+            n_pool = get_pool_size(n_proc)
+            if mainperson_chunksize is None:
+                mainperson_chunksize = -(-n_person // (4 * n_pool))
+            mainperson_chunksize = max(1, mainperson_chunksize)
+            task_list = []
+            for mp_start in range(0, n_person, mainperson_chunksize):
+                mp_end = min(mp_start + mainperson_chunksize, n_person)
+                task_list.append((mp_start, mp_end,
+                                  None if random_handle_list is None else random_handle_list[mp_start:mp_end]))
+            with self._open_state_pool(n_pool, state,
+                                       get_reference_tables(person_list, kwargs_features)) as p:
+                chunk_list = p.map(create_mainperson_connections, task_list)
+        else:
+            chunk_list = [create_mainperson_connections(state, 0, n_person, random_handle_list)]
+
+        # merge the chunks (in the order of the mainpersons)
         connection_list = []
         person_connection_index_list = []
         n_total_connection = 0
-        # loop over all persons in the person_list
-        for mp_idx in range(n_person):
-            mainperson = person_list[mp_idx]
-
-            # get mainperson data
-            mainperson_relatives_tuple = mainperson[COL_PERSON_RELATIVES_TUPLE]
-
-            # -----------------------------
-            # add known connections
-            # -----------------------------
-
-            # init the number of known connections for the current mainperson
-            n_person_known_connection = 0
+        for chunk_connection_list, connection_count_list in chunk_list:
+            connection_list.extend(chunk_connection_list)
+            for n_person_known_connection, n_person_random_connection in connection_count_list:
+                # update person connection index
+                person_connection_index_list.append((
+                    n_total_connection, n_person_known_connection, n_person_random_connection))
+                n_total_connection += n_person_known_connection + n_person_random_connection
+
+        if return_connection_graph:
+            connection_graph = ConnectionGraph.from_connection_list(
+                connection_list, person_connection_index_list)
+            return (connection_list, fieldnames, person_connection_index_list, connection_graph)
+        return (connection_list, fieldnames, person_connection_index_list)
 
-            # add all relatives as linkpersons from the maainperson
-            for mainperson_relative in mainperson_relatives_tuple:
-                # get the linkperson data from the person list
-                linkperson, lp_idx = get_listitem_from_list_by_handle(person_list, mainperson_relative[COL_RELATIVE_PERSON_HANDLE], COL_PERSON_HANDLE)
-                # a linkperson could not be found in the person_list for instance when
-                # include_none_date = True and the birth_date of the linkperson is unknown
-                if linkperson:
-                    # get linktype between mainperson and linkperson
-                    linktype = mainperson_relative[COL_RELATIVE_LINKTYPE]
-                    # in person is "ByGender" the default setting for linktype
-                    # map linktype to gender neutral omes in the case of taht linktype_mode
-                    if linktype_mode.lower() == "neutral":
-                        if linktype == "Vader":
-                            linktype = "Ouder"                
-                        elif linktype == "Moeder":
-                            linktype = "Ouder"                
-                        elif linktype == "Man":
-                            linktype = "Echtgeno(o)t(e)"                
-                        elif linktype == "Vrouw":
-                            linktype = "Echtgeno(o)t(e)"
-
-                    # create and add connection
-                    connection = (mp_idx, lp_idx, linktype)
-                    # calc all feature values for this specific connection_list
-                    result = False
-                    for mlfeature in mlfeature_list:
-                        featurevalue, result = mlfeature.get_value(mainperson, linkperson, linktype,
-                            name_similarity_mode=name_similarity_mode,
-                            include_none_dates=include_none_dates,
-                            max_abs_age_delta=max_abs_age_delta,
-                            **kwargs_features)
-                        if result:
-                            connection = connection + (featurevalue,)
-                        else:
-                            # Stop the loop and dan't add the connection
-                            break
-                    # Only add the connections for which all features returns a valid value
-                    if result:
-                        connection_list.append(connection)
-                        n_person_known_connection += 1
-
-            # -----------------------------
-            # add random connections
-            # -----------------------------
-
-            # init the number of random connections for the current mainperson
-            n_person_random_connection = 0
-
-            if add_random_connections:
-                # Check whether the list is long enough to get the desired unique random items
-                # Otherwise the while loop will not end in finding unique items
-                # TODO the randomly chosen handle(s) could (or shuold) also be made unique
-                if (random_connections_per_person - 1) < (n_person - len(mainperson_relatives_tuple)):
-                    for conn_pp in range(random_connections_per_person):                 
-                        random_person_handle = get_random_handle_from_list(person_list, COL_PERSON_HANDLE)
-                        while random_person_handle in mainperson_relatives_tuple:
-                            random_person_handle = get_random_handle_from_list(person_list, COL_PERSON_HANDLE)
-
-                        # get the linkperson data from the person list
-                        linkperson, lp_idx = get_listitem_from_list_by_handle(person_list, random_person_handle, COL_PERSON_HANDLE)
-                        # a check on the existance of linkperson isn't necessary because
-                        # it's chose from the available ones.
-                        # get linktype between mainperson and linkperson
-                        linktype = "Onbekend"
-
-                        # create and add connection
-                        connection = (mp_idx, lp_idx, linktype)
-                        # calc all feature values for this specific connection_list
-                        result = False
-                        for mlfeature in mlfeature_list:
-                            featurevalue, result = mlfeature.get_value(mainperson, linkperson, linktype,
-                                name_similarity_mode=name_similarity_mode,
-                                include_none_dates=include_none_dates,
-                                max_abs_age_delta=max_abs_age_delta,
-                                **kwargs_features)
-                            if result:
-                                connection = connection + (featurevalue,)
-                            else:
-                                # Stop the loop and dan't add the connection
-                                break
-                        # Only add the connections fro which all features returns a valid value
-                        if result:
-                            connection_list.append(connection)
-                            n_person_random_connection += 1
-
-            # update person connection index
-            person_connection_index_list.append((
-                n_total_connection, n_person_known_connection, n_person_random_connection))
-            n_total_connection += n_person_known_connection + n_person_random_connection
+    def _prepare_personlinks(self, person_list: list,
+                             connection_list: list,
+                             person_connection_index_list: list,
+                             features: tuple,
+                             name_similarity_mode: tuple,
+                             include_none_dates: bool,
+                             max_abs_age_delta: int,
+                             connection_graph: ConnectionGraph,
+                             name_blocking_mode: tuple,
+                             kwargs_features: dict) -> (tuple, PersonlinkWorkerState):
+        """ The fieldnames of the personlinks and everything which is needed to
+            create them (shared by get_personlink_list and iter_personlinks)
+        """
+        # set feature object list
+        mlfeature_list = self.get_mlfeature_list(features)
 
-        return (connection_list, fieldnames, person_connection_index_list)
+        # set fieldnames
+        fieldnames = self.get_personlink_fieldnames(features)
+
+        # set the handle index of the occupation_table
+        kwargs_features = add_occupation_table_index(kwargs_features)
+        # cache the distances between the surnames
+        kwargs_features = add_surname_distance_cache(kwargs_features, person_list, mlfeature_list)
+        # normalize the occupations once
+        kwargs_features = add_occupation_codebook(kwargs_features, person_list, mlfeature_list)
+        # count the siblings and children once
+        kwargs_features = add_relative_counts(kwargs_features, person_list, mlfeature_list,
+                                              self._relative_counts)
+        # parse the residences and occupations once
+        kwargs_features = add_valuesets(kwargs_features, person_list, mlfeature_list)
+
+        # The windows of linkpersons are limited by the age delta. So without
+        # the AgeDelta feature no personlinks are created at all.
+        has_age_delta_feature = False
+        for mlfeature in mlfeature_list:
+            if mlfeature.get_name().lower() == "agedelta":
+                has_age_delta_feature = True
+        # convert the birth dates once instead of for every pair of persons
+        birth_sdn_list = get_birth_date_sdn_list(person_list)
+        # get the window [lo, hi) of linkpersons within max_abs_age_delta
+        # for every mainperson (the person_list should be sorted on birth_date)
+        age_window_lo = None
+        age_window_hi = None
+        if has_age_delta_feature:
+            age_window_lo, age_window_hi = get_age_window_arrays(
+                birth_sdn_list, include_none_dates, max_abs_age_delta)
+            age_window_lo = age_window_lo.tolist()
+            age_window_hi = age_window_hi.tolist()
+        # index the known connections per mainperson
+        if connection_graph is None:
+            connection_graph = ConnectionGraph.from_connection_list(
+                connection_list, person_connection_index_list)
+        # index the names for blocking
+        name_index = None
+        if name_blocking_mode is not None:
+            if name_blocking_mode[0] == 'QGram':
+                name_index = QGramNameIndex(person_list, q=name_blocking_mode[1],
+                                            min_overlap=name_blocking_mode[2])
+            elif name_blocking_mode[0] == 'BKTree':
+                name_index = BKTreeNameIndex(person_list)
+                if (name_similarity_mode[0] == 'LevenshteinDistanceBool') and \
+                   (kwargs_features.get('surname_bktree') is None):
+                    kwargs_features = dict(kwargs_features)
+                    kwargs_features['surname_bktree'] = name_index.bktree
+
+        state = PersonlinkWorkerState(mlfeature_list,
+                                      name_similarity_mode,
+                                      include_none_dates,
+                                      max_abs_age_delta,
+                                      person_list,
+                                      birth_sdn_list,
+                                      [],
+                                      kwargs_features,
+                                      connection_graph,
+                                      name_index,
+                                      age_window_lo,
+                                      age_window_hi)
+        return (fieldnames, state)
+
+    def iter_personlinks(self, person_list: list,
+                         connection_list: list = None,
+                         person_connection_index_list: list = None,
+                         features: tuple = None,
+                         name_similarity_mode: tuple = ("LevenshteinDistanceRelative", _LEVENSHTEIN_DISTANCE_THRESHOLD),
+                         include_none_dates: bool = False,
+                         max_abs_age_delta: int = ABS_AGE_DELTA_ONE_GENERATION,
+                         n_proc: int = -1,
+                         connection_graph: ConnectionGraph = None,
+                         name_blocking_mode: tuple = None,
+                         mainperson_chunksize: int = 100,
+                         max_pending_chunks: int = None,
+                         **kwargs_features):
+        """ Generator version of get_personlink_list: yields lists of
+            personlinks, one per chunk of mainperson_chunksize mainpersons, so
+            neither the pairs of persons nor all personlinks are kept in memory.
+            The fieldnames are those of get_personlink_fieldnames(features).
+
+            With more than one process (n_proc, see get_personlink_list) the
+            chunks are created by a pool (imap_unordered), so the lists are
+            yielded in the order in which they are ready. At most
+            max_pending_chunks (default: 2 * the number of processes) chunks are
+            in progress or waiting to be yielded, the next chunk is only
+            started when a list has been yielded.
+
+            The other parameters are those of get_personlink_list.
+        """
+        fieldnames, state = self._prepare_personlinks(
+            person_list, connection_list, person_connection_index_list, features,
+            name_similarity_mode, include_none_dates, max_abs_age_delta,
+            connection_graph, name_blocking_mode, kwargs_features)
+
+        mainperson_chunksize = max(1, mainperson_chunksize)
+        mp_range_list = [(mp_start, min(mp_start + mainperson_chunksize, len(person_list)))
+                         for mp_start in range(0, len(person_list), mainperson_chunksize)]
+
+        use_multiprocesses = (n_proc < 0) or (n_proc > 1)
+        if not use_multiprocesses:
+            for mp_start, mp_end in mp_range_list:
+                yield create_mainperson_personlinks(state, mp_start, mp_end)
+            return
+
+        n_pool = get_pool_size(n_proc)
+        if max_pending_chunks is None:
+            max_pending_chunks = 2 * n_pool
+        # back-pressure: the pool takes the tasks from this generator (in its
+        # own thread) as fast as possible, unless it has to wait for a slot
+        pending_slots = threading.Semaphore(max(1, max_pending_chunks))
+        stopped = threading.Event()
+
+        def iter_tasks():
+            for mp_range in mp_range_list:
+                pending_slots.acquire()
+                if stopped.is_set():
+                    return
+                yield mp_range
+
+        p = self._open_state_pool(n_pool, state,
+                                  get_reference_tables(person_list, state.kwargs_features))
+        try:
+            for personlink_list in p.imap_unordered(create_mainperson_personlinks, iter_tasks()):
+                pending_slots.release()
+                yield personlink_list
+        finally:
+            # also when the caller stops early: let iter_tasks end
+            stopped.set()
+            for i in range(len(mp_range_list)):
+                pending_slots.release()
+            p.close()
 
     def get_personlink_list(self, person_list: list,
                             connection_list: list = None,
@@ -1388,6 +4440,10 @@ class MLGrampsConnect:
                             include_none_dates: bool = False,
                             max_abs_age_delta: int = ABS_AGE_DELTA_ONE_GENERATION,
                             n_proc: int = -1,
+                            connection_graph: ConnectionGraph = None,
+                            name_blocking_mode: tuple = None,
+                            pool_mode: str = 'SharedState',
+                            pool_chunksize: int = 10000,
                             **kwargs_features) -> list:
         """
             include_none_dates: bool (default: Fales)
@@ -1398,55 +4454,62 @@ class MLGrampsConnect:
                 Number of processors (if available) which has to be used to perform 
                 this task. If set to -1 the maximum available processers is used. Value
                 0 is treated as 1 and values <-1 as -1.
+            connection_graph: ConnectionGraph (default: None)
+                The connection_list as ConnectionGraph (see get_connection_list). If
+                None it's built from connection_list and person_connection_index_list.
+            name_blocking_mode: tuple (default: None)
+                None: all pairs of persons within the age window are evaluated.
+                ('QGram', q, min_overlap): only the pairs with a pair of names that
+                passes the threshold of name_similarity_mode are evaluated, they
+                are found with a q-gram index (see QGramNameIndex). With
+                min_overlap 0 the blocking is lossless, a higher min_overlap is
+                faster but skips some of these pairs.
+                ('BKTree',): as 'QGram' but the names are searched in a BKTree,
+                which is lossless. With 'LevenshteinDistanceBool' the BKTree is also
+                used by MLFeatureSurnameSimilarity (kwargs_features['surname_bktree']).
+            pool_mode: str (default: 'SharedState')
+                How the pool of processes (n_proc) gets its work.
+                'SharedState': every worker gets the person_list, the features
+                and kwargs_features once (see StatePool) and the tasks
+                are chunks of (mp_idx, lp_idx, linktype_code) of pool_chunksize
+                pairs. 'SharedMemory': as 'SharedState', but the persons, their
+                birth dates and relative counts are read from a PersonTable in
+                shared memory (see SharedPersonTable), so the memory doesn't grow
+                with n_proc. 'PerTask': every pair is a task with its own persons,
+                features and kwargs_features (which are all pickled per task),
+                without the caches of add_surname_distance_cache and add_valuesets.
+            pool_chunksize: int (default: 10000)
+                The number of pairs per task with pool_mode 'SharedState' and
+                'SharedMemory'.
         """
-        def get_personlink_args(mlfeature_list, mainperson, mp_idx: int, lp_idx: int,
-                                linktype: str = None,
-                                lp_idx_list: list = None,
-                                name_similarity_mode: tuple = None,
-                                include_none_dates: bool = False,
-                                max_abs_age_delta: int = ABS_AGE_DELTA_ONE_GENERATION,
-                                **kwargs_features):
-            args = None
-            # get linkperson by index
-            linkperson = person_list[lp_idx]
-            # get age delta in years
-            result = False
-            for mlfeature in mlfeature_list:
-                if mlfeature.get_name().lower() == "agedelta":
-                    age_delta, result = mlfeature.get_value(mainperson, linkperson, linktype,
-                        name_similarity_mode=name_similarity_mode,
-                        include_none_dates=include_none_dates,
-                        max_abs_age_delta=max_abs_age_delta,
-                        **kwargs_features)
-                    if result:
-                        # Exclude the connection of a person to himself/herself
-                        # and links that belongs to the connection_list
-                        if (mp_idx != lp_idx) and (lp_idx not in lp_idx_list):
-                            args = (mlfeature_list,
-                                    name_similarity_mode,
-                                    include_none_dates,
-                                    max_abs_age_delta,
-                                    mp_idx, person_list[mp_idx],
-                                    lp_idx, person_list[lp_idx],
-                                    linktype, age_delta,
-                                    kwargs_features)
-                    break
-            return args
-        
-        # set feature object list
-        mlfeature_list = self.get_mlfeature_list(features)
+        if pool_mode not in _PERSONLINK_POOL_MODES:
+            raise ValueError("Unknown pool_mode {!r}, expected one of {}".format(
+                pool_mode, ", ".join(_PERSONLINK_POOL_MODES)))
+        pool_chunksize = max(1, pool_chunksize)
+
+        fieldnames, state = self._prepare_personlinks(
+            person_list, connection_list, person_connection_index_list, features,
+            name_similarity_mode, include_none_dates, max_abs_age_delta,
+            connection_graph, name_blocking_mode, kwargs_features)
+        connection_graph = state.connection_graph
 
-        # set fieldnames
-        fieldnames = MAIN_LINK_PERSON_FIELDNAMES + (TARGET_FIELDNAME,)
-        for mlfeature in mlfeature_list:
-            fieldnames = fieldnames + (mlfeature.get_title(),)
 
-        n_cpu = multiprocessing.cpu_count()
-        n_person = len(person_list)
-        
         use_multiprocesses = (n_proc < 0) or (n_proc > 1) 
-        if use_multiprocesses:
+        use_shared_state = use_multiprocesses and (pool_mode in ('SharedState', 'SharedMemory'))
+        if use_shared_state:
+            # the tasks (mp_idx, lp_idx, linktype_code) are collected in int32
+            # chunks of pool_chunksize pairs
+            chunk_list = []
+            task_buffer = array.array('i')
+            task_buffer_size = 3 * pool_chunksize
+            linktype_vocabulary = Vocabulary()
+        elif use_multiprocesses:
             args_list = []
+            # the caches of all persons are not shipped with every task: the
+            # worker parses the value date lists of its pairs, and the
+            # distances of a task's own SurnameDistanceCache would be lost
+            task_kwargs_features = {key: value for key, value in state.kwargs_features.items()
+                                    if key not in ('valuesets', 'surname_distance_cache')}
         else:
             personlink_list = []    
 
@@ -1455,25 +4518,15 @@ class MLGrampsConnect:
         now_begin = datetime.now()
         now_interval_begin = now_begin
         c_person = 0
-       
-       
-        for mp_idx in range(n_person):
-            # get mainperson by index
-            mainperson = person_list[mp_idx]
-
-            # get all the connections for the mainperson
-            # get person_connection_index
-            person_connection_index = person_connection_index_list[mp_idx]
-            # get person_connection_index data
-            conn_start_idx = person_connection_index[COL_PERSON_CONNECTION_INDEX_CONNSTARTIDX]
-            n_known_conn = person_connection_index[COL_PERSON_CONNECTION_INDEX_NKNOWNCONN]
-            n_rand_conn = person_connection_index[COL_PERSON_CONNECTION_INDEX_NRANDCONN]
-            conn_end_idx = conn_start_idx+ n_known_conn + n_rand_conn
-            mp_connection_sublist = connection_list[conn_start_idx:conn_end_idx]
-            lp_idx_list = [connection[COL_CONNECTION_LINKINDEX] for connection in mp_connection_sublist]
-
 
+        # the window [lo, hi) of linkpersons within max_abs_age_delta for
+        # every mainperson (the person_list should be sorted on birth_date)
+        if state.age_window_lo is not None:
+            mp_idx_list = range(len(person_list))
+        else:
+            mp_idx_list = ()
 
+        for mp_idx in mp_idx_list:
             # temp
             c_person += 1
             if c_person % 1000 == 0:
@@ -1484,69 +4537,149 @@ class MLGrampsConnect:
                     now_interval - now_interval_begin))
                 now_interval_begin = now_interval
 
-            
-            
-
-            # from mp_idx search DOWNWARDS till max_abs_age_delta
-            # (because pers_list should be sorted on birth_date the
-            # for loop can be stopped when args is set to None)
-            for lp_idx in range(mp_idx - 1, -1, -1):
-                linktype = get_value_from_list_by_dict(mp_connection_sublist,
-                    {COL_CONNECTION_LINKINDEX: lp_idx}, COL_CONNECTION_LINKTYPE)
-                args = get_personlink_args(mlfeature_list, mainperson, mp_idx, lp_idx,
-                                           linktype=linktype,
-                                           lp_idx_list=lp_idx_list,
-                                           name_similarity_mode=name_similarity_mode,
-                                           include_none_dates=include_none_dates,
-                                           max_abs_age_delta=max_abs_age_delta,
-                                           **kwargs_features)
-                if args:
-                    if use_multiprocesses:
-                        args_list.append(args)
-                    else:
-                        personlink = create_personlink(args)
-                        if personlink:
-                            # Include valid elements only
-                            personlink_list.append(personlink)
+            for lp_idx in get_linkperson_index_list(state, mp_idx):
+                linktype = connection_graph.get_linktype(mp_idx, lp_idx)
+                if use_shared_state:
+                    # the worker gets the persons, the age delta, etc. itself
+                    task_buffer.extend((mp_idx, lp_idx,
+                                        -1 if linktype is None else linktype_vocabulary.get_id(linktype)))
+                    if len(task_buffer) >= task_buffer_size:
+                        chunk_list.append((np.frombuffer(task_buffer, dtype=np.int32).reshape(-1, 3),))
+                        task_buffer = array.array('i')
+                elif use_multiprocesses:
+                    # get age delta in years (from the precomputed birth dates, this
+                    # is the value of MLFeatureAgeDelta)
+                    age_delta, result = get_age_delta_inyears_from_sdn(
+                        state.birth_sdn_list[lp_idx], state.birth_sdn_list[mp_idx],
+                        accept_none_dates=include_none_dates,
+                        max_abs_age_delta=max_abs_age_delta)
+                    args_list.append((state.mlfeature_list,
+                                      name_similarity_mode,
+                                      include_none_dates,
+                                      max_abs_age_delta,
+                                      mp_idx, person_list[mp_idx],
+                                      lp_idx, person_list[lp_idx],
+                                      linktype, age_delta,
+                                      task_kwargs_features))
                 else:
-                    break
-            # from mp_idx search UPWARDS till max_abs_age_delta
-            # (because pers_list should be sorted on birth_date the
-            # for loop can be stopped when args is set to None)
-            for lp_idx in range(mp_idx + 1, n_person, 1):
-                linktype = get_value_from_list_by_dict(mp_connection_sublist,
-                    {COL_CONNECTION_LINKINDEX: lp_idx}, COL_CONNECTION_LINKTYPE)
-                args = get_personlink_args(mlfeature_list, mainperson, mp_idx, lp_idx,
-                                           linktype=linktype,
-                                           lp_idx_list=lp_idx_list,
-                                           name_similarity_mode=name_similarity_mode,
-                                           include_none_dates=include_none_dates,
-                                           max_abs_age_delta=max_abs_age_delta,
-                                           **kwargs_features)
-                if args:
-                    if use_multiprocesses:
-                        args_list.append(args)
-                    else:
-                        personlink = create_personlink(args)
-                        if personlink:
-                            # Include valid elements only
-                            personlink_list.append(personlink)
-                else:
-                    break
+                    personlink = get_personlink(state, mp_idx, lp_idx, linktype)
+                    if personlink:
+                        # Include valid elements only
+                        personlink_list.append(personlink)
 
         if use_multiprocesses:
-            if n_proc < 0:
-                n_pool = n_cpu
+            n_pool = get_pool_size(n_proc)
+        if use_shared_state:
+            # the workers don't need the indexes of the pairs of persons
+            state = state._replace(linktype_values=linktype_vocabulary.values,
+                                   connection_graph=None, name_index=None,
+                                   age_window_lo=None, age_window_hi=None)
+            if task_buffer:
+                chunk_list.append((np.frombuffer(task_buffer, dtype=np.int32).reshape(-1, 3),))
+            del task_buffer
+            reference_tables = get_reference_tables(person_list, state.kwargs_features)
+            if pool_mode == 'SharedMemory':
+                with SharedPersonTable.from_person_list(person_list) as shared_table:
+                    # the persons, birth dates and relative counts are read
+                    # from the shared block
+                    kwargs_features = state.kwargs_features
+                    if 'relative_counts' in kwargs_features:
+                        kwargs_features = dict(kwargs_features)
+                        kwargs_features['relative_counts'] = shared_table.get_relative_counts()
+                    state = state._replace(person_list=shared_table,
+                                           birth_sdn_list=shared_table.get_birth_sdn_list(),
+                                           kwargs_features=kwargs_features)
+                    with self._open_state_pool(n_pool, state, reference_tables) as p:
+                        personlink_chunk_list = p.map(create_personlink_tasks, chunk_list)
+                    state = None
             else:
-                # n_proc > 1 (see check above)
-                n_pool = min(n_proc, n_cpu)
-            p = Pool(n_pool)
-            personlink_list = p.map(create_personlink, args_list)
+                with self._open_state_pool(n_pool, state, reference_tables) as p:
+                    personlink_chunk_list = p.map(create_personlink_tasks, chunk_list)
+            personlink_list = [personlink for personlink_chunk in personlink_chunk_list
+                               for personlink in personlink_chunk]
+        elif use_multiprocesses:
+            worker_session = self._get_worker_session()
+            if worker_session is not None:
+                personlink_list = worker_session.pool.map(create_personlink, args_list)
+            else:
+                with Pool(n_pool) as p:
+                    personlink_list = p.map(create_personlink, args_list)
             # Filter None elements (which the mechanism of map can't exclude)
             personlink_list = [personlink for personlink in personlink_list if personlink != None]
 
         return (personlink_list, fieldnames)
 
+    def get_personlink_list_checkpointed(self, checkpoint_dir: str,
+                                         person_list: list,
+                                         connection_list: list = None,
+                                         person_connection_index_list: list = None,
+                                         features: tuple = None,
+                                         name_similarity_mode: tuple = ("LevenshteinDistanceRelative", _LEVENSHTEIN_DISTANCE_THRESHOLD),
+                                         include_none_dates: bool = False,
+                                         max_abs_age_delta: int = ABS_AGE_DELTA_ONE_GENERATION,
+                                         n_proc: int = -1,
+                                         connection_graph: ConnectionGraph = None,
+                                         name_blocking_mode: tuple = None,
+                                         mainperson_shard_size: int = 10000,
+                                         run_key: str = None,
+                                         **kwargs_features) -> (list, tuple):
+        """ get_personlink_list which can be resumed: the personlinks of every
+            mainperson_shard_size mainpersons are saved as a shard in
+            checkpoint_dir (see PersonlinkCheckpoint). When it's called again
+            after a crash (with the same input and parameters) the finished
+            shards are not created again. The result is the same as that of
+            get_personlink_list.
+
+            run_key: str (default: None)
+                The key of the run in the checkpoint (see PersonlinkCheckpoint). If
+                None it's a hash of the input and the parameters (see
+                get_personlink_run_key), pass a key of your own to skip hashing
+                the input.
+
+            With more than one process (n_proc) the shards are created by a pool.
+            The other parameters are those of get_personlink_list.
+        """
+        if run_key is None:
+            run_key = get_personlink_run_key(
+                person_list, connection_list, person_connection_index_list, connection_graph,
+                features, name_similarity_mode, include_none_dates, max_abs_age_delta,
+                name_blocking_mode, mainperson_shard_size, kwargs_features)
+        checkpoint = PersonlinkCheckpoint(checkpoint_dir, run_key)
+
+        fieldnames, state = self._prepare_personlinks(
+            person_list, connection_list, person_connection_index_list, features,
+            name_similarity_mode, include_none_dates, max_abs_age_delta,
+            connection_graph, name_blocking_mode, kwargs_features)
+
+        mainperson_shard_size = max(1, mainperson_shard_size)
+        mp_range_list = [(mp_start, min(mp_start + mainperson_shard_size, len(person_list)))
+                         for mp_start in range(0, len(person_list), mainperson_shard_size)]
+        todo_mp_range_list = [mp_range for mp_range in mp_range_list
+                              if not checkpoint.has_shard(*mp_range)]
+
+        use_multiprocesses = (n_proc < 0) or (n_proc > 1)
+        if use_multiprocesses and (len(todo_mp_range_list) > 1):
+            with self._open_state_pool(get_pool_size(n_proc), state,
+                                       get_reference_tables(person_list, state.kwargs_features)) as p:
+                for mp_range, personlink_shard in p.imap_unordered(create_mainperson_shard,
+                                                                   todo_mp_range_list):
+                    checkpoint.save_shard(mp_range[0], mp_range[1], personlink_shard)
+        else:
+            for mp_start, mp_end in todo_mp_range_list:
+                checkpoint.save_shard(mp_start, mp_end,
+                                      create_mainperson_personlinks(state, mp_start, mp_end))
+
+        personlink_list = []
+        for mp_start, mp_end in mp_range_list:
+            personlink_shard = checkpoint.load_shard(mp_start, mp_end)
+            if personlink_shard is None:
+                # damaged after it was saved
+                personlink_shard = create_mainperson_personlinks(state, mp_start, mp_end)
+                checkpoint.save_shard(mp_start, mp_end, personlink_shard)
+            personlink_list.extend(personlink_shard)
+
+        return (personlink_list, fieldnames)
+
 
 ###################################################################
 #
@@ -1644,6 +4777,9 @@ if __name__ == "__main__":
                                                                include_empty_residence=False)
     print("{} | Number of persons: {:,}".format(datetime.now() - now_begin, len(person_list)))
 
+    # Index the person_list once (handle -> position) for all connection_lists
+    person_index = PersonIndex(person_list)
+
     # ---------------------------------------------------------------------
     # Option 3a: Save person_list as CSV file
     # ---------------------------------------------------------------------
@@ -1694,80 +4830,87 @@ if __name__ == "__main__":
     # temp_n_random_conn_pps = (0, 1, 5)
     temp_n_random_conn_pps = (5,)
 
-    for features_set in features_sets:
-        for linktype_mode in temp_linktype_modes:
-            for n_random_conn_pp in temp_n_random_conn_pps:     
+    # One pool of processes for all jobs, the person_list and the occupation
+    # tables are sent to the processes once
+    with mlgc.session(n_proc=-1, reference_tables=(person_list, GLOBAL_occupation_table,
+                                                   occupation_replacement_table)):
+        for features_set in features_sets:
+            for linktype_mode in temp_linktype_modes:
+                for n_random_conn_pp in temp_n_random_conn_pps:     
             
-                # ---------------------------------------------------------------------
-                # Step 5: Get connection_list
-                #         For ML model building (classification): feature list and
-                #         target (LinkType) regarding relations between two persons.
-                #         Including indices to persons in the person_list.
-                # ---------------------------------------------------------------------
-
-                kwargs_features = {'use_occupation_table': True,
-                                   'occupation_replacement_table': occupation_replacement_table,
-                                   'stopword_words_list': stopword_words_list,
-                                   'place_words_list': place_words_list,
-                                   'occupation_exclude_words_list': occupation_exclude_words_list,
-                                   'occupation_table': GLOBAL_occupation_table}
-
-                connection_list, connection_fieldnames, person_connection_index_list = \
-                    mlgc.get_connection_list(person_list=person_list,
-                                             features=features_set,
-                                             linktype_mode=linktype_mode,
-                                             name_similarity_mode=('LevenshteinDistanceRelative', 3),
-                                             n_random_conn_pp=n_random_conn_pp,
-                                             randomseed=None,
-                                             max_abs_age_delta=ABS_AGE_DELTA_ONE_GENERATION,
-                                             **kwargs_features)
-                print("{} | Number of connections: {:,} - (Features: {}, Linktype: {}, n_random_conn_pp: {})".format(
-                    datetime.now() - now_begin, len(connection_list),
-                    len(features_set), linktype_mode, n_random_conn_pp))
-
-                # ---------------------------------------------------------------------
-                # Option 5a: Save connection_list and person_connection_index_list as
-                #            CSV files
-                # ---------------------------------------------------------------------
-
-                connection_list_csv = cur_dir_path + "/" + "connection_list.csv"
-                save_list_as_csv(connection_list_csv,
-                                connection_list, connection_fieldnames)
-                print("{} | Filesize connection_list.csv: {:,}".format(
-                    datetime.now() - now_begin, os.path.getsize(connection_list_csv)))
-
-                person_connection_index_list_csv = cur_dir_path + "/" + "person_connection_index_list.csv"
-                save_list_as_csv(person_connection_index_list_csv,
-                                person_connection_index_list, PERSON_CONNECTION_INDEX_FIELDNAMES)
-                print("{} | Filesize person_connection_index_list.csv: {:,}".format(
-                    datetime.now() - now_begin, os.path.getsize(person_connection_index_list_csv)))
-
-                # ---------------------------------------------------------------------
-                # Step 6: Get personlink_list
-                #         For ML model operation (classification): feature list and
-                #         known targets between any combination of persons within a
-                #         maximum age difference.
-                #         Including indices to persons in the person_list
-                # ---------------------------------------------------------------------
-
-                personlink_list, personlink_fieldnames = \
-                    mlgc.get_personlink_list(person_list, connection_list,
-                        person_connection_index_list,
-                        features=features_set,
-                        name_similarity_mode=('LevenshteinDistanceBool', 3),
-                        include_none_dates=False,
-                        max_abs_age_delta=ABS_AGE_DELTA_ONE_GENERATION, n_proc=-1,
-                        **kwargs_features)
-                print("{} | Number of personlinks: {:,}".format(
-                    datetime.now() - now_begin, len(personlink_list)))
+                    # ---------------------------------------------------------------------
+                    # Step 5: Get connection_list
+                    #         For ML model building (classification): feature list and
+                    #         target (LinkType) regarding relations between two persons.
+                    #         Including indices to persons in the person_list.
+                    # ---------------------------------------------------------------------
+
+                    kwargs_features = {'use_occupation_table': True,
+                                       'occupation_replacement_table': occupation_replacement_table,
+                                       'stopword_words_list': stopword_words_list,
+                                       'place_words_list': place_words_list,
+                                       'occupation_exclude_words_list': occupation_exclude_words_list,
+                                       'occupation_table': GLOBAL_occupation_table}
+
+                    connection_list, connection_fieldnames, person_connection_index_list, connection_graph = \
+                        mlgc.get_connection_list(person_list=person_list,
+                                                 features=features_set,
+                                                 linktype_mode=linktype_mode,
+                                                 name_similarity_mode=('LevenshteinDistanceRelative', 3),
+                                                 n_random_conn_pp=n_random_conn_pp,
+                                                 randomseed=None,
+                                                 max_abs_age_delta=ABS_AGE_DELTA_ONE_GENERATION,
+                                                 person_index=person_index,
+                                                 return_connection_graph=True,
+                                                 **kwargs_features)
+                    print("{} | Number of connections: {:,} - (Features: {}, Linktype: {}, n_random_conn_pp: {})".format(
+                        datetime.now() - now_begin, len(connection_list),
+                        len(features_set), linktype_mode, n_random_conn_pp))
+
+                    # ---------------------------------------------------------------------
+                    # Option 5a: Save connection_list and person_connection_index_list as
+                    #            CSV files
+                    # ---------------------------------------------------------------------
+
+                    connection_list_csv = cur_dir_path + "/" + "connection_list.csv"
+                    save_list_as_csv(connection_list_csv,
+                                    connection_list, connection_fieldnames)
+                    print("{} | Filesize connection_list.csv: {:,}".format(
+                        datetime.now() - now_begin, os.path.getsize(connection_list_csv)))
+
+                    person_connection_index_list_csv = cur_dir_path + "/" + "person_connection_index_list.csv"
+                    save_list_as_csv(person_connection_index_list_csv,
+                                    person_connection_index_list, PERSON_CONNECTION_INDEX_FIELDNAMES)
+                    print("{} | Filesize person_connection_index_list.csv: {:,}".format(
+                        datetime.now() - now_begin, os.path.getsize(person_connection_index_list_csv)))
+
+                    # ---------------------------------------------------------------------
+                    # Step 6: Get personlink_list
+                    #         For ML model operation (classification): feature list and
+                    #         known targets between any combination of persons within a
+                    #         maximum age difference.
+                    #         Including indices to persons in the person_list
+                    # ---------------------------------------------------------------------
+
+                    personlink_list, personlink_fieldnames = \
+                        mlgc.get_personlink_list(person_list, connection_list,
+                            person_connection_index_list,
+                            features=features_set,
+                            name_similarity_mode=('LevenshteinDistanceBool', 3),
+                            include_none_dates=False,
+                            max_abs_age_delta=ABS_AGE_DELTA_ONE_GENERATION, n_proc=-1,
+                            connection_graph=connection_graph,
+                            **kwargs_features)
+                    print("{} | Number of personlinks: {:,}".format(
+                        datetime.now() - now_begin, len(personlink_list)))
         
-                # ---------------------------------------------------------------------
-                # Option 6a: Save personlink_list as CSV file
-                # ---------------------------------------------------------------------
-
-                personlink_list_csv = cur_dir_path + "/" + "personlink_list.csv"
-                save_list_as_csv(personlink_list_csv,
-                                personlink_list, personlink_fieldnames)
-                print("{} | Filesize personlink_list.csv: {:,}".format(
-                    datetime.now() - now_begin, os.path.getsize(personlink_list_csv)))
+                    # ---------------------------------------------------------------------
+                    # Option 6a: Save personlink_list as CSV file
+                    # ---------------------------------------------------------------------
+
+                    personlink_list_csv = cur_dir_path + "/" + "personlink_list.csv"
+                    save_list_as_csv(personlink_list_csv,
+                                    personlink_list, personlink_fieldnames)
+                    print("{} | Filesize personlink_list.csv: {:,}".format(
+                        datetime.now() - now_begin, os.path.getsize(personlink_list_csv)))
 
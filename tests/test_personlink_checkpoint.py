@@ -0,0 +1,144 @@
+import os
+
+import pytest
+
+import mlgrampsconnect
+from mlgrampsconnect import ConnectionGraph
+from mlgrampsconnect import MLGrampsConnect
+from mlgrampsconnect import PersonlinkCheckpoint
+from mlgrampsconnect import get_personlink_run_key
+
+_FEATURES = ("GenderCombination", "AgeDelta", "SurnameSimilarity",
+             "KnownLinktype", "NumberOfSiblingsEquality")
+_SURNAMES = ("Berg", "Bergen", "Visser", "Vissers", "Jansen", "Janssen",
+             "Bakker", "Backer", "Smit", "Smits")
+_SHARD_SIZE = 10
+
+
+def write_gramps_xml(filename: str, n_family: int = 12):
+    """ A family tree with a father, a mother and three children per family
+    """
+    events = []
+    people = []
+    families = []
+
+    def add_person(n_person, gender, surname, year, childof=None, parentin=None):
+        handle = "_p{:04d}".format(n_person)
+        event_handle = "_e{:04d}".format(n_person)
+        events.append('<event handle="{}" id="E{:04d}"><type>Birth</type>'
+                      '<dateval val="{}-05-{:02d}"/></event>'.format(
+                          event_handle, n_person, year, 1 + n_person % 28))
+        person = ['<person handle="{}" id="I{:04d}"><gender>{}</gender>'
+                  '<name type="Birth Name"><first>Jan</first><surname>{}</surname></name>'
+                  '<eventref hlink="{}" role="Primary"/>'
+                  '<attribute type="Beroep" value="landbouwer"/>'
+                  '<attribute type="Woonplaats" value="Ede"/>'.format(
+                      handle, n_person, gender, surname, event_handle)]
+        if childof:
+            person.append('<childof hlink="{}"/>'.format(childof))
+        if parentin:
+            person.append('<parentin hlink="{}"/>'.format(parentin))
+        person.append('</person>')
+        people.append(''.join(person))
+        return handle
+
+    n_person = 0
+    for i in range(n_family):
+        family_handle = "_f{:04d}".format(i)
+        surname = _SURNAMES[i % len(_SURNAMES)]
+        year = 1800 + 7 * i
+        father = add_person(n_person, "M", surname, year, parentin=family_handle)
+        mother = add_person(n_person + 1, "F", _SURNAMES[(i + 3) % len(_SURNAMES)], year + 2,
+                            parentin=family_handle)
+        children = [add_person(n_person + 2 + j, "MF"[j % 2], surname, year + 25 + 3 * j,
+                               childof=family_handle)
+                    for j in range(3)]
+        n_person += 5
+        families.append('<family handle="{}" id="F{:04d}"><father hlink="{}"/><mother hlink="{}"/>{}</family>'.format(
+            family_handle, i, father, mother,
+            ''.join('<childref hlink="{}"/>'.format(child) for child in children)))
+
+    with open(filename, "w") as xml_file:
+        xml_file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                       '<database xmlns="http://gramps-project.org/xml/1.7.1/">\n'
+                       '<events>{}</events>\n<people>{}</people>\n<families>{}</families>\n'
+                       '</database>\n'.format(''.join(events), ''.join(people), ''.join(families)))
+
+
+@pytest.fixture
+def personlink_input(tmp_path):
+    filename = str(tmp_path / "gramps.xml")
+    write_gramps_xml(filename)
+    mlgc = MLGrampsConnect()
+    mlgc.load(filename)
+    person_list, person_fieldnames = mlgc.get_person_list(sort_by_birthdate=True)
+    connection_list, connection_fieldnames, person_connection_index_list = \
+        mlgc.get_connection_list(person_list, _FEATURES, n_random_conn_pp=2, randomseed=7)
+    return mlgc, person_list, connection_list, person_connection_index_list
+
+
+def test_resume_with_the_same_connection_graph(personlink_input, tmp_path, monkeypatch):
+    mlgc, person_list, connection_list, person_connection_index_list = personlink_input
+    kwargs = dict(features=_FEATURES, max_abs_age_delta=30, n_proc=1)
+    expected = mlgc.get_personlink_list(person_list, connection_list, person_connection_index_list, **kwargs)
+    assert len(person_list) > 2 * _SHARD_SIZE
+
+    # crash after two shards, the (fresh) graph has been used by then
+    kwargs['connection_graph'] = ConnectionGraph.from_connection_list(connection_list,
+                                                                      person_connection_index_list)
+    save_shard = PersonlinkCheckpoint.save_shard
+    saved_shards = []
+
+    def crashing_save_shard(self, mp_start, mp_end, personlink_list):
+        if len(saved_shards) == 2:
+            raise KeyboardInterrupt
+        saved_shards.append(mp_start)
+        save_shard(self, mp_start, mp_end, personlink_list)
+
+    checkpoint_dir = str(tmp_path / "checkpoint")
+    monkeypatch.setattr(PersonlinkCheckpoint, "save_shard", crashing_save_shard)
+    with pytest.raises(KeyboardInterrupt):
+        mlgc.get_personlink_list_checkpointed(checkpoint_dir, person_list, connection_list,
+                                              person_connection_index_list,
+                                              mainperson_shard_size=_SHARD_SIZE, **kwargs)
+    monkeypatch.setattr(PersonlinkCheckpoint, "save_shard", save_shard)
+
+    # resume with the same (used) graph: only the missing shards are created
+    create_mainperson_personlinks = mlgrampsconnect.create_mainperson_personlinks
+    created_shards = []
+
+    def counting_create_mainperson_personlinks(state, mp_start, mp_end):
+        created_shards.append(mp_start)
+        return create_mainperson_personlinks(state, mp_start, mp_end)
+
+    monkeypatch.setattr(mlgrampsconnect, "create_mainperson_personlinks",
+                        counting_create_mainperson_personlinks)
+    assert mlgc.get_personlink_list_checkpointed(checkpoint_dir, person_list, connection_list,
+                                                 person_connection_index_list,
+                                                 mainperson_shard_size=_SHARD_SIZE, **kwargs) == expected
+    assert sorted(set(created_shards) & set(saved_shards)) == []
+    assert sorted(created_shards + saved_shards) == list(range(0, len(person_list), _SHARD_SIZE))
+
+
+def test_run_key_of_a_used_connection_graph(personlink_input):
+    mlgc, person_list, connection_list, person_connection_index_list = personlink_input
+    fresh_graph = ConnectionGraph.from_connection_list(connection_list, person_connection_index_list)
+    used_graph = ConnectionGraph.from_connection_list(connection_list, person_connection_index_list)
+    mlgc.get_personlink_list(person_list, connection_list, person_connection_index_list,
+                             features=_FEATURES, n_proc=1, connection_graph=used_graph)
+    assert get_personlink_run_key(person_list, used_graph, _FEATURES) == \
+        get_personlink_run_key(person_list, fresh_graph, _FEATURES)
+
+
+def test_other_run_in_checkpoint_dir(personlink_input, tmp_path):
+    mlgc, person_list, connection_list, person_connection_index_list = personlink_input
+    checkpoint_dir = str(tmp_path / "checkpoint")
+    kwargs = dict(features=_FEATURES, max_abs_age_delta=30, n_proc=1)
+    personlink_list, fieldnames = mlgc.get_personlink_list_checkpointed(
+        checkpoint_dir, person_list, connection_list, person_connection_index_list,
+        mainperson_shard_size=_SHARD_SIZE, **kwargs)
+    assert os.path.exists(os.path.join(checkpoint_dir, "manifest.json"))
+    with pytest.raises(ValueError):
+        mlgc.get_personlink_list_checkpointed(checkpoint_dir, person_list, connection_list,
+                                              person_connection_index_list,
+                                              mainperson_shard_size=_SHARD_SIZE + 1, **kwargs)